@@ -1,72 +1,57 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
 from PyPDF2 import PdfReader
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def preProcessData(data):
-    prompt = f"""Extract and organize the data from the uploaded document (Excel or PDF) into a well-structured format. The output should include the following:
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from app import create_app
+from app.chatbot.catalog import ingest_document
+from app.chatbot.usage import usage_tracker
 
-                1. Package Names: List all the names of the packages or categories mentioned in the document.
-                
-                2. Pricing:
-                    - Extract all price-related information, including standard pricing, discounted pricing, and renewal costs if available.
-                    - Highlight any introductory offers or special terms for pricing.
-                
-                3. Features/Inclusions:
-                    - List all included features for each package (e.g., WiFi, meeting room access, parking spaces, discounts).
-                    - Specify feature usage limits (e.g., "5 hours/month of meeting room usage").
-                
-                4. Additional Services:
-                    - Extract details of any optional or add-on services, along with their associated costs.
-                
-                5. Conditions/Notes:
-                    - Summarize any additional notes, terms, or conditions mentioned in the document.
-                
-                6. Structure:
-                    - Output the information in a clear and readable format.
-                    - Ensure the data is aligned correctly with the associated categories. Retain any numerical values, units, or other specifications (e.g., hours, AED, percentages). If any information appears incomplete or ambiguous, note this explicitly."
-                
-                Data :- {data}
-                """
-    template = PromptTemplate(template=prompt, input_variables=["data"])
 
-    model = ChatOpenAI(temperature=0.3, model='gpt-4o-mini')
+# Backend app, used to write the packages and LLM usage to the chat database.
+# Streamlit reruns this script on every interaction, so it is created once per process.
+@st.cache_resource
+def get_backend_app():
+    return create_app()
 
-    chain = template | model
 
-    results = chain.invoke(input={"data": data})
+def ingest_upload(file, file_type, read_document, document_key, replace):
+    """Store the packages of an uploaded file and show them. Unchanged files are skipped."""
+    with get_backend_app().app_context():
+        result = ingest_document(document_key, file.name, file_type, file.getvalue(), read_document, replace=replace)
+    usage_tracker.flush()
 
-    print(results.content)
+    if result["key_in_use"]:
+        st.warning(f"A document is already stored under the key '{document_key}'. Tick 'Replace' to replace it.")
+        return
+    if not result["stored"]:
+        st.info("This document was uploaded before, its packages are already stored.")
+        return
+    st.success(f"Stored {len(result['packages'])} packages from {file.name} under the key '{document_key}'.")
+    if result["packages"]:
+        st.dataframe(pd.DataFrame(result["packages"]))
 
-    return results.content
 
-def process_excel(file):
-    """Function to process and display Excel file content."""
+def process_excel(file, document_key, replace):
+    """Function to ingest Excel file content."""
     try:
-        df = pd.read_excel(file)
-        st.write("Excel File Content:")
-        st.dataframe(df)
+        ingest_upload(file, "xlsx", lambda: pd.read_excel(file), document_key, replace)
     except Exception as e:
         st.error(f"An error occurred while processing the Excel file: {e}")
 
-def process_pdf(file):
-    """Function to process and display PDF file content."""
-    try:
+def process_pdf(file, document_key, replace):
+    """Function to ingest PDF file content."""
+    def read_text():
         pdf_reader = PdfReader(file)
-        text_content = ""
-        for page in pdf_reader.pages:
-            text_content += page.extract_text()
-        st.write("PDF File Content:")
-        
-        # Pre-process the extracted text with OpenAI
-        extracted_data = preProcessData(text_content)
-        
-        # Display the result in the Streamlit app
-        st.text_area("Extracted and Processed Data", value=extracted_data, height=300)
+        return "".join(page.extract_text() or "" for page in pdf_reader.pages)
+
+    try:
+        ingest_upload(file, "pdf", read_text, document_key, replace)
     except Exception as e:
         st.error(f"An error occurred while processing the PDF file: {e}")
 
@@ -75,16 +60,20 @@ def process_pdf(file):
 st.title("Admin Panel for Uploading PDF and Excel Files")
 st.sidebar.header("Upload Section")
 uploaded_file = st.sidebar.file_uploader("Upload a file (PDF or Excel)", type=["pdf", "xlsx"])
+document_key = st.sidebar.text_input("Catalog key", help="Identifies the document, e.g. the freezone name.").strip()
+replace = st.sidebar.checkbox("Replace the document stored under this key")
 
-if uploaded_file is not None:
+if uploaded_file is not None and not document_key:
+    st.sidebar.warning("Enter a catalog key for the uploaded file.")
+elif uploaded_file is not None:
     file_type = uploaded_file.name.split('.')[-1].lower()
     
     st.sidebar.success(f"Uploaded {uploaded_file.name}")
 
     if file_type == "xlsx":
-        process_excel(uploaded_file)
+        process_excel(uploaded_file, document_key, replace)
     elif file_type == "pdf":
-        process_pdf(uploaded_file)
+        process_pdf(uploaded_file, document_key, replace)
     else:
         st.error("Unsupported file type. Please upload a PDF or Excel file.")
 else:
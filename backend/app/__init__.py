@@ -18,8 +18,13 @@ def create_app():
     app.config.from_object('app.config.Config')
     CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}})
 
+    # Size the database pool from the config (unless engine options are set explicitly)
+    from app.db_pool import build_engine_options, init_db_pool
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', build_engine_options(app.config))
+
     # Initialize extensions
     db.init_app(app)
+    init_db_pool(app, db)
     migrate.init_app(app, db)
     jwt.init_app(app)
     oauth.init_app(app)
@@ -45,4 +50,33 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(chatbot_bp, url_prefix='/chatbot')
 
+    from app.auth.identity import init_user_cache
+    init_user_cache(app)
+
+    from app.auth.hashing import init_password_hashing
+    init_password_hashing(app)
+
+    # Prometheus metrics endpoint
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    # Compile the LLM chains once and share a pooled HTTP client between them
+    from app.chatbot.chains import init_chains
+    init_chains(app)
+
+    from app.chatbot.usage import init_usage_tracking
+    init_usage_tracking(app)
+
+    from app.chatbot.admission import init_admission
+    init_admission(app)
+
+    from app.chatbot.cache import init_response_cache
+    init_response_cache(app)
+
+    from app.chatbot.utils import init_faq_cache
+    init_faq_cache(app)
+
+    from app.chatbot.recommend import init_recommender
+    init_recommender(app)
+
     return app
@@ -0,0 +1,92 @@
+# app/auth/hashing.py
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+
+# Password hashing is deliberately CPU-expensive, so it runs in a small process pool
+# instead of on the request thread. A semaphore bounds the running + queued jobs.
+_lock = threading.Lock()
+_executor = None
+_slots = threading.BoundedSemaphore(4)
+_settings = {
+    "workers": 2,
+    "method": "scrypt:32768:8:1",
+    "queue_wait": 0.5,
+    "timeout": 10.0,
+    "prefix": None,
+}
+
+
+def init_password_hashing(app):
+    global _slots, _executor
+    with _lock:
+        _settings["workers"] = app.config['PASSWORD_HASH_WORKERS']
+        _settings["method"] = app.config['PASSWORD_HASH_METHOD']
+        _settings["queue_wait"] = app.config['PASSWORD_HASH_QUEUE_WAIT']
+        _settings["timeout"] = app.config['PASSWORD_HASH_TIMEOUT']
+        # werkzeug spells the method out in full in the hash ("scrypt" -> "scrypt:32768:8:1"),
+        # so compare against a hash it actually produced
+        _settings["prefix"] = generate_password_hash("x", _settings["method"]).split("$", 1)[0]
+        _slots = threading.BoundedSemaphore(_settings["workers"] + app.config['PASSWORD_HASH_QUEUE_LIMIT'])
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def _get_executor():
+    # Created on first use so CLI commands never start worker processes. Workers are
+    # spawned, not forked, so they do not inherit the app's threads and connections.
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=_settings["workers"], mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _reset_executor(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=_settings["queue_wait"]):
+        raise HashingBusy()
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        _slots.release()
+        _reset_executor(executor)
+        raise
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result(timeout=_settings["timeout"])
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _settings["method"])
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True when the hash was made with another method or cost than the configured one."""
+    if _settings["prefix"] is None:
+        _settings["prefix"] = generate_password_hash("x", _settings["method"]).split("$", 1)[0]
+    return password_hash.split("$", 1)[0] != _settings["prefix"]
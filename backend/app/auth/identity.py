@@ -0,0 +1,50 @@
+# app/auth/identity.py
+import threading
+from cachetools import TTLCache
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from app.models import User
+
+# Small per-process cache of user rows for tokens issued before the claims were added
+_lock = threading.Lock()
+_users = TTLCache(maxsize=10000, ttl=300)
+
+
+def init_user_cache(app):
+    global _users
+    with _lock:
+        _users = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+
+def user_claims(user):
+    """Claims stored in the access token so authenticated requests need no user lookup."""
+    return {"email": user.email, "username": user.username}
+
+
+def current_user_id():
+    return int(get_jwt_identity())
+
+
+def get_user_info(user_id):
+    """Return {"id", "email", "username"} of a user, from the cache when possible, or None."""
+    with _lock:
+        info = _users.get(user_id)
+    if info is not None:
+        return info
+
+    user = User.query.get(user_id)
+    if not user:
+        return None
+    info = {"id": user.id, "email": user.email, "username": user.username}
+    with _lock:
+        _users[user_id] = info
+    return info
+
+
+def current_user_info():
+    """Identity of the authenticated user, taken from the token claims when they are present."""
+    claims = get_jwt()
+    user_id = current_user_id()
+    if "email" in claims and "username" in claims:
+        return {"id": user_id, "email": claims["email"], "username": claims["username"]}
+    return get_user_info(user_id)
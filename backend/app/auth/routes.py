@@ -2,12 +2,20 @@
 from flask import Blueprint, request, jsonify, redirect, url_for, current_app, make_response
 from app import db
 from app.models import User
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from app.auth.hashing import HashingBusy, hash_password, needs_rehash, verify_password
+from flask_jwt_extended import create_access_token, jwt_required
+from app.auth.identity import current_user_info, user_claims
 from datetime import timedelta
 
 auth_bp = Blueprint('auth', __name__)
 
+
+# Returned when the password hashing pool is saturated
+def server_busy(key):
+    response = jsonify({key: "Server is busy, please try again shortly."})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # Register a new user
 @auth_bp.route('/register', methods=['POST'])
 def register_user():
@@ -24,13 +32,15 @@ def register_user():
         if existing_user:
             return jsonify({"message": "User already exists."}), 400
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         new_user = User(email=email, password_hash=hashed_password, username=username)
 
         db.session.add(new_user)
         db.session.commit()
 
         return jsonify({"message": "User registered successfully."}), 201
+    except HashingBusy:
+        return server_busy("message")
     except Exception as e:
         current_app.logger.error(f"Error occurred: {str(e)}")
         return jsonify({"message": "Internal server error."}), 500
@@ -48,16 +58,28 @@ def login():
             return jsonify({"msg": "Email and password are required"}), 400
 
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not verify_password(user.password_hash, password):
             return jsonify({"msg": "Invalid credentials"}), 401
 
+        # Upgrade hashes made with an older method or cost while we have the password.
+        # This is best-effort: a busy or slow hashing pool must not fail the login.
+        if needs_rehash(user.password_hash):
+            try:
+                user.password_hash = hash_password(password)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.warning(f"Skipped password rehash for user {user.id}: {e!r}")
+
         user_info = {
             "email": user.email,
             "username": user.username
         }
 
         # Generate access token
-        access_token = create_access_token(identity=str(user.id), expires_delta=timedelta(hours=1))
+        access_token = create_access_token(
+            identity=str(user.id), additional_claims=user_claims(user), expires_delta=timedelta(hours=1)
+        )
 
         # Set HTTP-only cookie for the token
         response = make_response(jsonify({"user": user_info}))
@@ -70,6 +92,8 @@ def login():
             max_age=3600     # Cookie expiration time in seconds
         )
         return response
+    except HashingBusy:
+        return server_busy("msg")
     except Exception as e:
         current_app.logger.error(f"Error during login: {str(e)}")
         return jsonify({"msg": "Internal server error."}), 500
@@ -80,15 +104,14 @@ def login():
 @jwt_required()
 def current_user():
     try:
-        current_user_id = get_jwt_identity()
-        print("gggggggggggggggggggg : ",current_user_id)
-        user = User.query.get(current_user_id)
+        # Read from the token claims, falling back to the user cache for older tokens
+        user = current_user_info()
         if not user:
             return jsonify({"message": "User not found"}), 404
 
         user_info = {
-            "email": user.email,
-            "username": user.username
+            "email": user["email"],
+            "username": user["username"]
         }
         return jsonify({"user": user_info}), 200
     except Exception as e:
@@ -144,7 +167,9 @@ def google_authorized():
         }
 
         # Generate access token
-        access_token = create_access_token(identity=str(user.id), expires_delta=timedelta(hours=1))
+        access_token = create_access_token(
+            identity=str(user.id), additional_claims=user_claims(user), expires_delta=timedelta(hours=1)
+        )
 
         response = redirect("http://localhost:3000/dashboard")  # Redirect to frontend
         response.set_cookie(
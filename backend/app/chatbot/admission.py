@@ -0,0 +1,174 @@
+# app/chatbot/admission.py
+import math
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from flask import jsonify
+
+# Admission control for the LLM endpoints: a token bucket per user and a global cap on
+# concurrent model calls. The state lives in a small SQLite file so every worker
+# process on the host shares the same buckets and slots.
+
+_settings = {
+    "enabled": True,
+    "path": None,
+    "user_rate": 0.5,
+    "user_burst": 5,
+    "max_concurrent": 16,
+    "queue_wait": 2.0,
+    "max_waiters": 32,
+    "slot_lease": 210.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (user_id TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS slots (slot_id TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS waiters (waiter_id TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+"""
+
+_POLL_INTERVAL = 0.05  # seconds between attempts while waiting for a slot
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is over its rate or no model slot frees up in time."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def init_admission(app):
+    _settings["enabled"] = app.config['ADMISSION_ENABLED']
+    _settings["path"] = app.config['ADMISSION_STATE_PATH']
+    _settings["user_rate"] = app.config['ADMISSION_USER_RATE']
+    _settings["user_burst"] = app.config['ADMISSION_USER_BURST']
+    _settings["max_concurrent"] = app.config['ADMISSION_MAX_CONCURRENT']
+    _settings["queue_wait"] = app.config['ADMISSION_QUEUE_WAIT']
+    _settings["max_waiters"] = app.config['ADMISSION_MAX_WAITERS']
+    # A slot must outlive the longest model call (every attempt timing out), otherwise
+    # it is reclaimed while the call still runs and the cap is exceeded
+    longest_call = app.config['OPENAI_TIMEOUT'] * (app.config['OPENAI_MAX_RETRIES'] + 1)
+    _settings["slot_lease"] = max(app.config['ADMISSION_SLOT_LEASE'], longest_call)
+
+    if _settings["enabled"]:
+        os.makedirs(os.path.dirname(_settings["path"]) or ".", exist_ok=True)
+        conn = sqlite3.connect(_settings["path"], timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+
+@contextmanager
+def _connect():
+    # A short-lived connection per operation: sqlite connections must not be shared
+    # across threads, and opening a local file is cheap next to an LLM call
+    conn = sqlite3.connect(_settings["path"], timeout=5, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def take_token(user_id):
+    """Take one request token from the user's bucket or raise AdmissionRejected."""
+    if not _settings["enabled"]:
+        return
+
+    rate, burst = _settings["user_rate"], _settings["user_burst"]
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE user_id = ?", (str(user_id),)).fetchone()
+        tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+        if tokens < 1:
+            raise AdmissionRejected("rate_limited", (1 - tokens) / rate)
+        conn.execute(
+            "INSERT INTO buckets (user_id, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (str(user_id), tokens - 1, now),
+        )
+
+
+def _try_acquire_slot(slot_id):
+    now = time.time()
+    with _connect() as conn:
+        # Slots of workers that died without releasing them expire after the lease
+        conn.execute("DELETE FROM slots WHERE expires_at < ?", (now,))
+        in_use = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+        if in_use >= _settings["max_concurrent"]:
+            return False
+        conn.execute("INSERT INTO slots (slot_id, expires_at) VALUES (?, ?)", (slot_id, now + _settings["slot_lease"]))
+        return True
+
+
+def _join_queue(waiter_id):
+    now = time.time()
+    with _connect() as conn:
+        # Waiters of workers that died while polling expire after the queue wait
+        conn.execute("DELETE FROM waiters WHERE expires_at < ?", (now,))
+        waiting = conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+        if waiting >= _settings["max_waiters"]:
+            return False
+        conn.execute(
+            "INSERT INTO waiters (waiter_id, expires_at) VALUES (?, ?)",
+            (waiter_id, now + _settings["queue_wait"] + 1),
+        )
+        return True
+
+
+def _leave_queue(waiter_id):
+    with _connect() as conn:
+        conn.execute("DELETE FROM waiters WHERE waiter_id = ?", (waiter_id,))
+
+
+def acquire_slot():
+    """
+    Wait up to ADMISSION_QUEUE_WAIT seconds for a free model slot. At most
+    ADMISSION_MAX_WAITERS requests wait at once, any further request is rejected
+    right away.
+
+    Returns:
+        str: The slot id to pass to release_slot, or None when admission is disabled.
+    """
+    if not _settings["enabled"]:
+        return None
+
+    slot_id = uuid.uuid4().hex
+    if _try_acquire_slot(slot_id):
+        return slot_id
+    if not _join_queue(slot_id):
+        raise AdmissionRejected("overloaded", 1)
+
+    try:
+        deadline = time.monotonic() + _settings["queue_wait"]
+        while not _try_acquire_slot(slot_id):
+            if time.monotonic() >= deadline:
+                raise AdmissionRejected("overloaded", 1)
+            time.sleep(_POLL_INTERVAL)
+    finally:
+        _leave_queue(slot_id)
+    return slot_id
+
+
+def release_slot(slot_id):
+    if slot_id is None:
+        return
+    with _connect() as conn:
+        conn.execute("DELETE FROM slots WHERE slot_id = ?", (slot_id,))
+
+
+# 429 response telling the client when to try again
+def too_many_requests(error):
+    response = jsonify({"msg": "Too many requests, please try again shortly."})
+    response.headers['Retry-After'] = str(max(1, math.ceil(error.retry_after)))
+    return response, 429
@@ -0,0 +1,60 @@
+# app/chatbot/cache.py
+import copy
+import hashlib
+import json
+import re
+import threading
+from cachetools import TTLCache
+
+
+def normalize_text(text):
+    # Case and whitespace differences should not produce different cache keys
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def make_cache_key(prompt_version, model, chain_inputs):
+    """
+    Hash of everything that determines the model output: the prompt version, the
+    model and the (normalized) prompt variables.
+    """
+    normalized = {key: normalize_text(value) for key, value in sorted(chain_inputs.items())}
+    payload = json.dumps([prompt_version, model, normalized], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with a TTL. Hits and misses are counted in app.metrics."""
+
+    def __init__(self, maxsize=1000, ttl=3600):
+        self._lock = threading.Lock()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def configure(self, maxsize, ttl):
+        with self._lock:
+            self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                return None
+        # Callers may modify the result, so never hand out the cached object itself
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        if self._cache.maxsize <= 0:
+            return
+        with self._lock:
+            self._cache[key] = copy.deepcopy(value)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Process-wide cache for /ask chain results, sized by init_response_cache
+response_cache = ResponseCache()
+
+
+def init_response_cache(app):
+    response_cache.configure(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'])
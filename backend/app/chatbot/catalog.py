@@ -0,0 +1,176 @@
+# app/chatbot/catalog.py
+import hashlib
+import re
+from typing import Dict, List, Optional
+import pandas as pd
+from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from app.chatbot.chains import register_chain, get_chain, strict_json_schema
+from app.chatbot.store import catalog_document_exists, catalog_key_exists, save_catalog_document
+from app.chatbot.usage import usage_config
+
+
+# Structured form of one freezone package, as stored in the packages table
+class AddOn(BaseModel):
+    name: str = Field(..., description="Name of the optional service.")
+    price: Optional[float] = Field(None, description="Price in AED, null if not stated.")
+
+
+class CatalogPackage(BaseModel):
+    freezone: str = Field(..., description="Name of the freezone offering the package.")
+    name: str = Field(..., description="Name of the package.")
+    location: Optional[str] = Field(None, description="Emirate or area of the freezone, null if not stated.")
+    activities: List[str] = Field(..., description="Business activities the package covers, empty if not stated.")
+    price: Optional[float] = Field(None, description="Standard price in AED, null if not stated.")
+    renewal_cost: Optional[float] = Field(None, description="Yearly renewal cost in AED, null if not stated.")
+    visas: Optional[int] = Field(None, description="Number of visas included, null if not stated.")
+    shareholders: Optional[int] = Field(None, description="Maximum number of shareholders, null if not stated.")
+    office_space: Optional[bool] = Field(None, description="Whether a physical office is included, null if not stated.")
+    features: List[str] = Field(..., description="Included features, e.g. 'meeting room access'.")
+    limits: List[str] = Field(..., description="Usage limits of the features, e.g. '5 hours/month of meeting room usage'.")
+    add_ons: List[AddOn] = Field(..., description="Optional services with their prices.")
+
+
+class CatalogExtraction(BaseModel):
+    packages: List[CatalogPackage] = Field(..., description="Every package found in the document.")
+
+
+CATALOG_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "catalog_extraction", "strict": True, "schema": strict_json_schema(CatalogExtraction)},
+}
+
+CATALOG_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=(
+        "Extract every freezone package from the uploaded document (Excel or PDF) into the response schema.\n"
+        "- Prices are in AED; convert other currencies only if the document gives the rate, otherwise use null.\n"
+        "- Use the standard price as `price`; put introductory offers and discounts in `features`.\n"
+        "- Keep numbers and units of features and limits as written (hours, AED, percentages).\n"
+        "- Never guess a value that is not in the document, use null or an empty list instead."
+    )),
+    ("human", "Document:\n{document}"),
+])
+
+register_chain(
+    "catalog_extract",
+    lambda model: CATALOG_PROMPT | model.bind(response_format=CATALOG_RESPONSE_FORMAT) | JsonOutputParser(),
+    temperature=0,
+    model="gpt-4o-mini",
+)
+
+# Spreadsheet headers that map straight to package columns, so such files need no model call
+COLUMN_ALIASES = {
+    "freezone": "freezone", "free zone": "freezone",
+    "package": "name", "package name": "name", "name": "name",
+    "location": "location", "emirate": "location",
+    "activities": "activities", "activity": "activities",
+    "price": "price", "cost": "price",
+    "renewal cost": "renewal_cost", "renewal": "renewal_cost",
+    "visas": "visas", "visa": "visas",
+    "shareholders": "shareholders",
+    "office space": "office_space", "office": "office_space",
+}
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _split_list(value) -> List[str]:
+    if value is None or pd.isna(value):
+        return []
+    return [part.strip() for part in re.split(r"[;\n]", str(value)) if part.strip()]
+
+
+def _number(value, cast=float):
+    # Spreadsheet cells may hold "AED 12,500" instead of a number
+    if value is None or pd.isna(value):
+        return None
+    try:
+        return cast(float(re.sub(r"[^\d.\-]", "", str(value))))
+    except ValueError:
+        return None
+
+
+def _flag(value) -> Optional[bool]:
+    if value is None or pd.isna(value):
+        return None
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "included")
+
+
+def packages_from_frame(frame: pd.DataFrame) -> Optional[List[Dict]]:
+    """
+    Packages read directly from a spreadsheet whose headers name the package columns
+    (at least freezone, package name and price), or None for any other layout.
+    """
+    columns = {}
+    for column in frame.columns:
+        alias = COLUMN_ALIASES.get(str(column).strip().lower().replace("_", " "))
+        if alias and alias not in columns.values():
+            columns[column] = alias
+    if not {"freezone", "name", "price"} <= set(columns.values()):
+        return None
+    frame = frame[list(columns)].rename(columns=columns)
+    packages = []
+    for row in frame.to_dict("records"):
+        if pd.isna(row.get("freezone")) or pd.isna(row.get("name")):
+            continue
+        packages.append({
+            "freezone": str(row["freezone"]).strip(),
+            "name": str(row["name"]).strip(),
+            "location": None if pd.isna(row.get("location")) else str(row["location"]).strip(),
+            "activities": _split_list(row.get("activities")),
+            "price": _number(row.get("price")),
+            "renewal_cost": _number(row.get("renewal_cost")),
+            "visas": _number(row.get("visas"), int),
+            "shareholders": _number(row.get("shareholders"), int),
+            "office_space": _flag(row.get("office_space")),
+            "features": [],
+            "limits": [],
+            "add_ons": [],
+        })
+    return packages
+
+
+def extract_packages(document: str) -> List[Dict]:
+    """Packages found in the document text by the model, validated against CatalogPackage."""
+    result = get_chain("catalog_extract").invoke({"document": document}, config=usage_config("catalog_extract"))
+    return [package.model_dump() for package in CatalogExtraction.model_validate(result).packages]
+
+
+def ingest_document(
+    document_key: str, filename: str, file_type: str, content: bytes, read_document, replace: bool = False
+) -> Dict:
+    """
+    Store the packages of an uploaded catalog document.
+
+    Args:
+        document_key (str): Key the admin gave the document, e.g. the freezone name.
+        filename (str): Name of the uploaded file.
+        file_type (str): 'pdf' or 'xlsx'.
+        content (bytes): The raw file, hashed to skip documents that are stored already.
+        read_document (callable): Returns the parsed document, a DataFrame or text.
+        replace (bool): Replace the document stored under the same key. Without it
+            an upload under a key that is in use is not stored.
+
+    Returns:
+        dict: document_id (None if not stored), the packages, whether the document
+        was stored and whether the key is in use by another document.
+    """
+    digest = content_hash(content)
+    if catalog_document_exists(digest):
+        return {"document_id": None, "packages": [], "stored": False, "key_in_use": False}
+    if not replace and catalog_key_exists(document_key):
+        return {"document_id": None, "packages": [], "stored": False, "key_in_use": True}
+
+    document = read_document()
+    packages = packages_from_frame(document) if isinstance(document, pd.DataFrame) else None
+    if packages is None:
+        text = document.to_csv(index=False) if isinstance(document, pd.DataFrame) else document
+        packages = extract_packages(text)
+
+    document_id = save_catalog_document(document_key[:255], filename[:255], file_type, digest, packages)
+    return {"document_id": document_id, "packages": packages, "stored": document_id is not None, "key_in_use": False}
@@ -0,0 +1,158 @@
+# app/chatbot/chains.py
+import threading
+from typing import Dict
+import httpx
+from langchain_openai import ChatOpenAI
+
+# Registered chain specs and the chains compiled from them
+_specs = {}
+_chains = {}
+_lock = threading.Lock()
+
+# Shared keep-alive HTTP client used by every sync ChatOpenAI model in this process
+_http_client = None
+
+# Replaces ChatOpenAI for every chain when set (see set_model_factory)
+_model_factory = None
+
+# HTTP settings, overridden from the app config by init_chains
+_settings = {
+    "OPENAI_MAX_CONNECTIONS": 20,
+    "OPENAI_MAX_KEEPALIVE_CONNECTIONS": 10,
+    "OPENAI_KEEPALIVE_EXPIRY": 60.0,
+    "OPENAI_TIMEOUT": 60.0,
+    "OPENAI_CONNECT_TIMEOUT": 5.0,
+    "OPENAI_MAX_RETRIES": 2,
+}
+
+
+def _build_http_client():
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=_settings["OPENAI_MAX_CONNECTIONS"],
+            max_keepalive_connections=_settings["OPENAI_MAX_KEEPALIVE_CONNECTIONS"],
+            keepalive_expiry=_settings["OPENAI_KEEPALIVE_EXPIRY"],
+        ),
+        timeout=httpx.Timeout(_settings["OPENAI_TIMEOUT"], connect=_settings["OPENAI_CONNECT_TIMEOUT"]),
+    )
+
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = _build_http_client()
+    return _http_client
+
+
+def make_model(shared_client=True, **model_kwargs):
+    """
+    Create a ChatOpenAI model. Sync calls go through the shared pooled client unless
+    `shared_client` is False.
+    """
+    model_kwargs.setdefault("max_retries", _settings["OPENAI_MAX_RETRIES"])
+    model_kwargs.setdefault("timeout", _settings["OPENAI_TIMEOUT"])
+    model_kwargs.setdefault("stream_usage", True)  # token counts for streamed replies too
+    if shared_client:
+        model_kwargs["http_client"] = get_http_client()
+    return ChatOpenAI(**model_kwargs)
+
+
+def _new_model(model_kwargs):
+    if _model_factory is not None:
+        return _model_factory(**model_kwargs)
+    return make_model(**model_kwargs)
+
+
+def set_model_factory(factory):
+    """
+    Build the model of every chain with `factory(**model_kwargs)` instead of ChatOpenAI,
+    e.g. a fake model for load tests. Pass None to go back to ChatOpenAI.
+    Chains compiled before are rebuilt on next use.
+    """
+    global _model_factory
+    with _lock:
+        _model_factory = factory
+        _chains.clear()
+
+
+def register_chain(name, compose, **model_kwargs):
+    """
+    Register a chain under `name`.
+
+    Args:
+        name (str): The registry key.
+        compose (callable): Takes a model and returns the runnable chain. Prompts and
+            parsers should be built once outside of it so they are reused.
+        **model_kwargs: Arguments for ChatOpenAI (model, temperature, ...).
+    """
+    _specs[name] = (compose, model_kwargs)
+    _chains.pop(name, None)
+
+
+def get_chain(name):
+    """Return the compiled chain for `name`, building it on first use."""
+    chain = _chains.get(name)
+    if chain is None:
+        with _lock:
+            chain = _chains.get(name)
+            if chain is None:
+                compose, model_kwargs = _specs[name]
+                chain = compose(_new_model(model_kwargs))
+                _chains[name] = chain
+    return chain
+
+
+def get_chain_model(name):
+    """Return the model name a registered chain runs on."""
+    _, model_kwargs = _specs[name]
+    return model_kwargs.get("model") or model_kwargs.get("model_name")
+
+
+def strict_json_schema(model_class) -> Dict:
+    """
+    JSON schema of a pydantic model in the form OpenAI structured outputs accept in
+    strict mode: references inlined, every property required (optional ones are
+    nullable instead), no additional properties and no defaults or titles.
+    """
+    schema = model_class.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def convert(node):
+        if "$ref" in node or len(node.get("allOf", [])) == 1:
+            target = definitions[node["$ref"].split("/")[-1]] if "$ref" in node else node["allOf"][0]
+            node = {**convert(target), **{k: v for k, v in node.items() if k not in ("$ref", "allOf")}}
+        converted = {}
+        for key, value in node.items():
+            if key in ("default", "title"):
+                continue
+            if key == "properties":
+                converted[key] = {name: convert(prop) for name, prop in value.items()}
+            elif key in ("anyOf", "allOf", "oneOf"):
+                converted[key] = [convert(option) for option in value]
+            elif key == "items" and isinstance(value, dict):
+                converted[key] = convert(value)
+            else:
+                converted[key] = value
+        if converted.get("type") == "object":
+            converted["required"] = list(converted.get("properties", {}))
+            converted["additionalProperties"] = False
+        return converted
+
+    return convert(schema)
+
+
+def init_chains(app):
+    """Create the shared HTTP client from the app config and compile every registered chain."""
+    global _http_client
+    with _lock:
+        for key in _settings:
+            _settings[key] = app.config.get(key, _settings[key])
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = _build_http_client()
+        _chains.clear()
+
+    for name in list(_specs):
+        get_chain(name)
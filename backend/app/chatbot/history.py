@@ -0,0 +1,65 @@
+# app/chatbot/history.py
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import tiktoken
+
+HISTORY_MODEL = "gpt-4o-mini"
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # Unknown model or the encoding file cannot be downloaded (offline)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = HISTORY_MODEL) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        # Rough estimate of ~4 characters per token
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+# Compact one-line-per-turn form used in the prompt instead of the dict repr
+def format_turn(turn: Dict[str, str]) -> str:
+    speaker = "User" if turn["role"] == "user" else "Assistant"
+    return f"{speaker}: {turn['content']}"
+
+
+def format_history(chat_history: List[Dict[str, str]]) -> str:
+    if not chat_history:
+        return "(no previous messages)"
+    return "\n".join(format_turn(turn) for turn in chat_history)
+
+
+# Turns as chat messages for a MessagesPlaceholder
+def history_messages(chat_history: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    return [("human" if turn["role"] == "user" else "ai", turn["content"]) for turn in chat_history]
+
+
+def fit_history(chat_history: List[Dict[str, str]], max_tokens: int, model: str = HISTORY_MODEL) -> List[Dict[str, str]]:
+    """
+    Keep the most recent turns that fit in the token budget.
+
+    Args:
+        chat_history (list): Turns in chronological order.
+        max_tokens (int): Token budget for the serialized history.
+        model (str): Model whose tokenizer is used for counting.
+
+    Returns:
+        list: The newest turns that fit, in chronological order.
+    """
+    kept = []
+    used = 0
+    for turn in reversed(chat_history):
+        cost = count_tokens(format_turn(turn), model) + 1  # +1 for the newline
+        if used + cost > max_tokens:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+    return kept
@@ -0,0 +1,23 @@
+# app/chatbot/http_cache.py
+import hashlib
+
+
+def make_etag(*parts):
+    return hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def is_not_modified(request, etag):
+    """
+    Check the request's If-None-Match header against the ETag, using the weak
+    comparison GET requests call for (RFC 9110). If-Modified-Since is not used: its
+    one-second resolution misses messages saved within the same second, and a date
+    cannot tell the pages of a chat apart, so the ETag is the only validator.
+    """
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def add_validators(response, etag):
+    response.set_etag(etag)
+    # Let clients keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
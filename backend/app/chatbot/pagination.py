@@ -0,0 +1,82 @@
+# app/chatbot/pagination.py
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Cursors are opaque to the client: base64 of the sort key of the last row sent
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+# Page size requested by the client, clamped to the allowed range
+def page_size(value, default, maximum):
+    if value is None:
+        return default
+    return max(1, min(value, maximum))
+
+
+def keyset_page(stmt, created_at_column, id_column, cursor, limit):
+    """
+    Restrict a Query/Select to the page after `cursor`, newest first.
+
+    One more row than the page size is fetched so split_page can tell whether
+    there is a next page.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.filter(tuple_(created_at_column, id_column) < tuple_(created_at, row_id))
+    return stmt.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def split_page(rows, limit):
+    """Return the rows of the page and the cursor of the next page (or None)."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def history_page(stmt, id_column, after_id, before_id, limit):
+    """
+    Restrict a Query/Select of messages to the ids between the cursors.
+
+    Without a limit every matching message is returned. With a limit, `after_id`
+    pages forward from the cursor and `before_id` alone returns the newest messages
+    before it (for scrolling up); one extra row is fetched to detect more pages.
+    """
+    if after_id is not None:
+        stmt = stmt.filter(id_column > after_id)
+    if before_id is not None:
+        stmt = stmt.filter(id_column < before_id)
+    if limit is None:
+        return stmt.order_by(id_column)
+    if after_id is None and before_id is not None:
+        return stmt.order_by(id_column.desc()).limit(limit + 1)
+    return stmt.order_by(id_column).limit(limit + 1)
+
+
+def split_history_page(rows, after_id, before_id, limit):
+    """Return the messages of the page in chronological order and whether there are more."""
+    if limit is None:
+        return rows, False
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None and before_id is not None:
+        rows = list(reversed(rows))
+    return rows, has_more
@@ -0,0 +1,297 @@
+# app/chatbot/recommend.py
+import copy
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+import pandas as pd
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Catalog columns. Only freezone, package and price are required; a missing limit
+# (visas, shareholders) means the package does not state one.
+REQUIRED_COLUMNS = ["freezone", "package", "price"]
+OPTIONAL_COLUMNS = ["location", "activities", "visas", "shareholders", "office_space", "renewal_cost"]
+
+# Score weights of the individual criteria
+WEIGHTS = {
+    "budget": 3.0,
+    "visas": 2.0,
+    "shareholders": 2.0,
+    "office_space": 1.5,
+    "location": 2.0,
+    "activities": 2.0,
+    "price": 0.5,  # tie-break towards cheaper packages
+}
+
+_settings = {
+    "app": None,
+    "path": None,
+    "top_k": 3,
+    "cache_size": 1024,
+    "reload_interval": 30.0,
+}
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def _split_values(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return [_normalize(part) for part in re.split(r"[;,|/]", str(value)) if part.strip()]
+
+
+def _as_bool(series):
+    return series.astype(str).str.strip().str.lower().isin({"1", "true", "yes", "y"}).to_numpy()
+
+
+def _matching_keys(index, text):
+    """Index keys that appear in the text as whole words, or contain the text."""
+    text = _normalize(text)
+    if not text:
+        return []
+    return [
+        key for key in index
+        if re.search(rf"(^|\W){re.escape(key)}($|\W)", text) or re.search(rf"(^|\W){re.escape(text)}($|\W)", key)
+    ]
+
+
+class FreezoneCatalog:
+    """
+    Freezone packages held as NumPy columns, with boolean row masks indexed by
+    location and by activity. Every package is scored against the collected
+    parameters in one vectorized pass; results are memoized per parameter set for
+    the lifetime of the catalog, so a new catalog version starts with an empty cache.
+    """
+
+    def __init__(self, frame, version, cache_size=1024):
+        missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Freezone catalog is missing columns: {', '.join(missing)}")
+        frame = frame.reindex(columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+        frame = frame[pd.to_numeric(frame["price"], errors="coerce").notna()].reset_index(drop=True)
+
+        self.version = version
+        self.size = len(frame)
+        self.freezone = frame["freezone"].astype(str).to_numpy()
+        self.package = frame["package"].astype(str).to_numpy()
+        self.location = frame["location"].fillna("").astype(str).to_numpy()
+        self.price = pd.to_numeric(frame["price"]).to_numpy(dtype=float)
+        self.renewal_cost = pd.to_numeric(frame["renewal_cost"], errors="coerce").to_numpy(dtype=float)
+        self.visas = pd.to_numeric(frame["visas"], errors="coerce").to_numpy(dtype=float)
+        self.shareholders = pd.to_numeric(frame["shareholders"], errors="coerce").to_numpy(dtype=float)
+        self.office_space = _as_bool(frame["office_space"])
+        self.max_price = float(self.price.max()) if self.size else 1.0
+
+        self.location_index = self._build_index(frame["location"].map(_split_values))
+        self.activity_index = self._build_index(frame["activities"].map(_split_values))
+
+        self._lock = threading.Lock()
+        self._cache = LRUCache(maxsize=max(cache_size, 1))
+
+    def _build_index(self, values_per_row):
+        index = {}
+        for row, values in enumerate(values_per_row):
+            for value in values:
+                index.setdefault(value, np.zeros(self.size, dtype=bool))[row] = True
+        return index
+
+    def _mask(self, index, text):
+        mask = np.zeros(self.size, dtype=bool)
+        for key in _matching_keys(index, text or ""):
+            mask |= index[key]
+        return mask
+
+    @staticmethod
+    def signature(parameters, k):
+        return (
+            parameters.get("no_of_shareholders"),
+            parameters.get("no_of_visas"),
+            _normalize(parameters.get("activities") or ""),
+            parameters.get("cost"),
+            parameters.get("office_space"),
+            _normalize(parameters.get("preferred_location") or ""),
+            k,
+        )
+
+    def recommend(self, parameters, k=3):
+        """
+        Top-k packages for the collected parameters.
+
+        Returns:
+            list: dicts with freezone, package, location, price, renewal_cost, score
+            and the reasons the package was picked, best first.
+        """
+        key = self.signature(parameters, k)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is None:
+            cached = self._rank(parameters, k)
+            with self._lock:
+                self._cache[key] = cached
+        return copy.deepcopy(cached)
+
+    def _rank(self, parameters, k):
+        if not self.size:
+            return []
+        score = -WEIGHTS["price"] * self.price / self.max_price
+
+        cost = parameters.get("cost")
+        if cost:
+            within_budget = self.price <= cost
+            overrun = np.clip((self.price - cost) / cost, 0, None)
+            score += WEIGHTS["budget"] * (within_budget.astype(float) - overrun)
+
+        visas = parameters.get("no_of_visas")
+        if visas is not None:
+            score += WEIGHTS["visas"] * np.where(np.isnan(self.visas), 0.5, self.visas >= visas)
+
+        shareholders = parameters.get("no_of_shareholders")
+        if shareholders is not None:
+            score += WEIGHTS["shareholders"] * np.where(np.isnan(self.shareholders), 0.5, self.shareholders >= shareholders)
+
+        office_space = parameters.get("office_space")
+        if office_space is not None:
+            score += WEIGHTS["office_space"] * (self.office_space == bool(office_space))
+
+        location_mask = self._mask(self.location_index, parameters.get("preferred_location"))
+        activity_mask = self._mask(self.activity_index, parameters.get("activities"))
+        score += WEIGHTS["location"] * location_mask + WEIGHTS["activities"] * activity_mask
+
+        k = min(k, self.size)
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top], kind="stable")]
+        return [
+            {
+                "freezone": self.freezone[row],
+                "package": self.package[row],
+                "location": self.location[row],
+                "price": float(self.price[row]),
+                "renewal_cost": None if np.isnan(self.renewal_cost[row]) else float(self.renewal_cost[row]),
+                "score": round(float(score[row]), 3),
+                "reasons": self._reasons(row, parameters, location_mask[row], activity_mask[row]),
+            }
+            for row in top
+        ]
+
+    def _reasons(self, row, parameters, location_match, activity_match):
+        reasons = []
+        cost = parameters.get("cost")
+        if cost:
+            if self.price[row] <= cost:
+                reasons.append(f"within your budget of AED {cost:,.0f}")
+            else:
+                reasons.append(f"AED {self.price[row] - cost:,.0f} above your budget")
+        visas = parameters.get("no_of_visas")
+        if visas is not None and not np.isnan(self.visas[row]):
+            if self.visas[row] >= visas:
+                reasons.append(f"allows up to {self.visas[row]:.0f} visas")
+            else:
+                reasons.append(f"only {self.visas[row]:.0f} visas included")
+        shareholders = parameters.get("no_of_shareholders")
+        if shareholders is not None and not np.isnan(self.shareholders[row]) and self.shareholders[row] >= shareholders:
+            reasons.append(f"up to {self.shareholders[row]:.0f} shareholders")
+        if parameters.get("office_space") and self.office_space[row]:
+            reasons.append("includes office space")
+        if location_match:
+            reasons.append(f"located in {self.location[row]}")
+        if activity_match:
+            reasons.append(f"covers {parameters.get('activities')}")
+        return reasons
+
+
+def load_catalog_csv(path, cache_size=1024):
+    return FreezoneCatalog(pd.read_csv(path), version=os.stat(path).st_mtime_ns, cache_size=cache_size)
+
+
+def load_catalog_database(version, cache_size=1024):
+    """Catalog of the packages ingested from admin uploads (see app.chatbot.catalog)."""
+    from app.chatbot.store import catalog_packages
+    frame = pd.DataFrame([dict(row) for row in catalog_packages()], columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    frame["activities"] = frame["activities"].map(lambda values: ";".join(values or []))
+    return FreezoneCatalog(frame, version=version, cache_size=cache_size)
+
+
+class CatalogHolder:
+    """
+    The current catalog of the process. Its source (the packages table, or the CSV
+    file at FREEZONE_CATALOG_PATH when set) is checked for a new version at most every
+    RECOMMENDATION_RELOAD_INTERVAL seconds and reloaded when it changed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._version = None
+        self._checked_at = None
+
+    def _source_version(self):
+        path = _settings["path"]
+        if path:
+            try:
+                return os.stat(path).st_mtime_ns
+            except OSError:
+                return None
+        if _settings["app"] is None:
+            return None
+        from app.chatbot.store import catalog_version
+        with _settings["app"].app_context():
+            count, last_id = catalog_version()
+        return (count, last_id) if count else None
+
+    def _load(self, version):
+        path = _settings["path"]
+        if path:
+            return load_catalog_csv(path, _settings["cache_size"])
+        with _settings["app"].app_context():
+            return load_catalog_database(version, _settings["cache_size"])
+
+    def get(self):
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < _settings["reload_interval"]:
+            return self._catalog
+
+        with self._lock:
+            if self._checked_at != checked_at:
+                return self._catalog
+            try:
+                version = self._source_version()
+                if version is None:
+                    self._catalog = None
+                elif version != self._version:
+                    self._catalog = self._load(version)
+                    logger.info("Loaded %d freezone packages (catalog version %s)", self._catalog.size, version)
+                self._version = version
+            except Exception as e:
+                logger.error("Could not load the freezone catalog: %s", e)
+            self._checked_at = time.monotonic()
+        return self._catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = None
+
+
+catalog_holder = CatalogHolder()
+
+
+def init_recommender(app):
+    _settings["app"] = app
+    _settings["path"] = app.config['FREEZONE_CATALOG_PATH']
+    _settings["top_k"] = app.config['RECOMMENDATION_TOP_K']
+    _settings["cache_size"] = app.config['RECOMMENDATION_CACHE_SIZE']
+    _settings["reload_interval"] = app.config['RECOMMENDATION_RELOAD_INTERVAL']
+    catalog_holder.invalidate()
+
+
+def recommend(parameters, k=None):
+    """Top-k packages for the parameters, or None when no catalog is available."""
+    catalog = catalog_holder.get()
+    if catalog is None:
+        return None
+    return catalog.recommend(parameters, k or _settings["top_k"])
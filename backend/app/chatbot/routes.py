@@ -1,86 +1,249 @@
 # app/chatbot/routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from app import db
-from app.models import Chat, Message, User
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models import Chat, LlmUsage, Message
+from flask_jwt_extended import jwt_required
+from app.auth.identity import current_user_id, current_user_info
 import json
+from datetime import datetime
 
-from app.chatbot.utils import process_user_input
+from app.chatbot.utils import answer_pending_slot, process_user_input, stream_user_input
+from app.chatbot.history import fit_history
+from app.chatbot.summary import schedule_summary_update
+from app.chatbot.pagination import (
+    InvalidCursor, history_page, keyset_page, page_size, split_history_page, split_page,
+)
+from app.chatbot.http_cache import add_validators, is_not_modified, make_etag
+from app.chatbot.store import find_chat, get_or_create_chat, save_turn, usage_totals, user_emails
+from app.chatbot.usage import usage_tracker
+from app.chatbot.admission import AdmissionRejected, acquire_slot, release_slot, take_token, too_many_requests
+from app.metrics import ASK_REQUESTS, track_stage
 # from utils import process_user_input
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
+
+# Load the most recent messages of a chat that are not covered by its summary yet
+# and trim them to the history token budget
+def load_chat_history(chat):
+    recent_messages = (
+        Message.query.filter(Message.chat_id == chat.id, Message.id > (chat.summary_message_id or 0))
+        .order_by(Message.timestamp.desc())
+        .limit(current_app.config['CHAT_HISTORY_MAX_MESSAGES'])
+        .all()
+    )
+    chat_history = [
+        {"role": "user" if msg.sender == "user" else "assistant", "content": msg.content}
+        for msg in reversed(recent_messages)
+    ]
+    return fit_history(chat_history, current_app.config['CHAT_HISTORY_TOKEN_BUDGET'])
+
+
 # Route to ask a query to the chatbot
 @chatbot_bp.route('/ask', methods=['POST'])
 @jwt_required()
 def ask_chatbot():
+    received_at = datetime.utcnow()
     data = request.get_json()
     
     chat_id = data.get('chat_id')
     message = data.get('message')
 
     if not chat_id or not message:
+        ASK_REQUESTS.labels(outcome="bad_request").inc()
         return jsonify({"msg": "Chat ID and message are required"}), 400
 
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user_id()
 
-    # Fetch or create chat for user
-    chat = Chat.query.filter_by(chat_id=chat_id, user_id=user.id).first()
-    if not chat:
-        chat = Chat(chat_id=chat_id, user_id=user.id, name=f"{message}")
-        db.session.add(chat)
+    # Per-user rate limit, checked before any database work
+    try:
+        take_token(user_id)
+    except AdmissionRejected as e:
+        ASK_REQUESTS.labels(outcome=e.reason).inc()
+        return too_many_requests(e)
+
+    # Look up the chat; a new chat is only created once the request is admitted
+    with track_stage("chat_lookup"):
+        chat = find_chat(chat_id, user_id)
+
+    # Fetch the recent chat history that fits in the prompt budget. The new message is
+    # not saved yet, it is passed to the model as the query.
+    chat_pk = chat.id if chat else None
+    chat_history, summary, collected_parameters, pending_slot = [], None, {}, None
+    with track_stage("history_load"):
+        if chat is not None:
+            chat_history = load_chat_history(chat)
+            summary = chat.summary
+            collected_parameters = chat.parameters or {}
+            pending_slot = chat.pending_slot
+
+        # End the read transaction so no connection is held while the model is generating
         db.session.commit()
 
-    # Add user message
-    user_message = Message(chat_id=chat.id, sender='user', content=message)
-    db.session.add(user_message)
-    db.session.commit()
+    # A plain answer to the pending question is filled in without the model, so it
+    # never waits for a model slot
+    answered = answer_pending_slot(message, chat_history, pending_slot, collected_parameters)
+    if answered is not None:
+        return respond_without_model(chat_pk, message, received_at, answered, stream=data.get('stream'))
+
+    # Wait briefly for one of the global model slots
+    try:
+        with track_stage("admission_wait"):
+            slot_id = acquire_slot()
+    except AdmissionRejected as e:
+        ASK_REQUESTS.labels(outcome=e.reason).inc()
+        return too_many_requests(e)
+
+    if chat is None:
+        with track_stage("chat_lookup"):
+            chat = get_or_create_chat(chat_id, user_id, name=f"{message}")
+            chat_pk = chat.id if chat else None
+            db.session.commit()
+        if chat_pk is None:
+            release_slot(slot_id)
+            ASK_REQUESTS.labels(outcome="not_found").inc()
+            return jsonify({"msg": "Chat not found for this user"}), 404
+
+    if data.get('stream'):
+        return stream_chatbot_response(
+            chat_pk, message, received_at, chat_history, summary, collected_parameters, slot_id,
+            user_id=user_id, chat_id=chat_id,
+        )
 
-    # Fetch all chat history
-    chat_history = Message.query.filter_by(chat_id=chat.id).order_by(Message.timestamp).all()
-    # print(f"Chat History for {chat.chat_id}:   {type(chat_history)}")
-    chat_history = [
-        {"role": "user" if msg.sender == "user" else "assistant", "content": msg.content}
-        for msg in chat_history
-    ]
-    # print(json.dumps(chat_history, indent=4))
-    # response = process_user_input(message, chat_history)
     try:
-        response = process_user_input(message, chat_history)
+        response, parameters, pending_slot = process_user_input(
+            message, chat_history, summary, collected_parameters, user_id=user_id, chat_id=chat_id,
+        )
     except Exception as e:
-        print(f"Error generating response: {e}")
+        current_app.logger.error(f"Error generating response: {e}")
+        ASK_REQUESTS.labels(outcome="llm_error").inc()
         response = "I'm sorry, it seems some error occurred while generating the response."
-        bot_message = Message(chat_id=chat.id, sender='assistant', content=response)
-        db.session.add(bot_message)
-        db.session.commit()
+        with track_stage("persist"):
+            save_turn(chat_pk, message, received_at, response)
 
         return jsonify({"response": response}), 200
+    finally:
+        release_slot(slot_id)
 
-    # print("agent's response : ",response)
+    # Save both messages and the collected parameters in one transaction
+    with track_stage("persist"):
+        save_turn(chat_pk, message, received_at, response, parameters, pending_slot)
+    ASK_REQUESTS.labels(outcome="ok").inc()
 
-    bot_message = Message(chat_id=chat.id, sender='assistant', content=response)
-    db.session.add(bot_message)
-    db.session.commit()
+    # Fold older messages into the rolling summary in the background
+    schedule_summary_update(current_app._get_current_object(), chat_pk)
 
     return jsonify({"response": response}), 200
 
+
+# Format a single Server-Sent Event
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+# Save and send a reply made without the model (see answer_pending_slot). Streaming
+# clients get it as a single token event followed by done.
+def respond_without_model(chat_pk, message, received_at, answered, stream=False):
+    response, parameters, pending_slot = answered
+    with track_stage("persist"):
+        save_turn(chat_pk, message, received_at, response, parameters, pending_slot)
+    ASK_REQUESTS.labels(outcome="ok").inc()
+    schedule_summary_update(current_app._get_current_object(), chat_pk)
+
+    if stream:
+        events = sse_event("token", {"delta": response}) + sse_event("done", {"response": response})
+        return Response(events, mimetype='text/event-stream', headers=SSE_HEADERS)
+    return jsonify({"response": response}), 200
+
+
+# Stream the chatbot response as Server-Sent Events and save it once the stream closes.
+# The model slot is released when generation ends, or when the client disconnects.
+def stream_chatbot_response(chat_pk, message, received_at, chat_history, summary=None, collected_parameters=None, slot_id=None,
+                            user_id=0, chat_id=""):
+    app = current_app._get_current_object()
+
+    def generate():
+        response = None
+        deltas = []
+        parameters = next_slot = None
+        outcome = "ok"
+        events = stream_user_input(
+            message, chat_history, summary, collected_parameters, user_id=user_id, chat_id=chat_id,
+        )
+        try:
+            for kind, value in events:
+                if kind == "token":
+                    deltas.append(value)
+                    yield sse_event("token", {"delta": value})
+                elif kind == "parameters":
+                    parameters = value
+                elif kind == "pending_slot":
+                    next_slot = value
+                else:
+                    response = value
+        except GeneratorExit:
+            # The client disconnected mid-stream: stop generating and keep what it was sent
+            events.close()
+            response = "".join(deltas)
+            outcome = "client_closed"
+            raise
+        except Exception as e:
+            app.logger.error(f"Error generating response: {e}")
+            response = "I'm sorry, it seems some error occurred while generating the response."
+            outcome = "llm_error"
+        finally:
+            # Runs on disconnect too, so the turn is saved once the stream closes
+            release_slot(slot_id)
+            with track_stage("persist"):
+                save_turn(chat_pk, message, received_at, response, parameters, next_slot)
+            ASK_REQUESTS.labels(outcome=outcome).inc()
+            schedule_summary_update(app, chat_pk)
+
+        yield sse_event("done", {"response": response})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS,
+    )
+
 @chatbot_bp.route('/latest-chats', methods=['GET'])
 @jwt_required()
 def get_latest_chats():
-    # Get the x parameter, default to 5
+    # Get the user id from the JWT token
+    user_id = current_user_id()
+
+    # Cursor mode: every page costs the same however deep the client scrolls
+    if 'x' not in request.args:
+        limit = page_size(
+            request.args.get('limit', type=int),
+            current_app.config['LATEST_CHATS_PAGE_SIZE'],
+            current_app.config['LATEST_CHATS_MAX_PAGE_SIZE'],
+        )
+        try:
+            query = keyset_page(
+                Chat.query.filter_by(user_id=user_id), Chat.created_at, Chat.id,
+                request.args.get('cursor'), limit,
+            )
+        except InvalidCursor:
+            return jsonify({"msg": "Invalid cursor"}), 400
+
+        latest_chats, next_cursor = split_page(query.all(), limit)
+        chats_data = [{"chat_id": chat.chat_id, "name": chat.name} for chat in latest_chats]
+        return jsonify({"latest_chats": chats_data, "next_cursor": next_cursor}), 200
+
+    # Offset mode, kept for clients that still send x
     x = request.args.get('x', default=5, type=int)
     
     # Calculate the starting index for the chats
     start_index = max(0, x - 5)  # Ensure the starting index is not negative
-    
-    # Get the user id from the JWT token
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
 
     # Fetch the chats from the calculated range
     latest_chats = (
-        Chat.query.filter_by(user_id=user.id)
+        Chat.query.filter_by(user_id=user_id)
         .order_by(Chat.created_at.desc())
         .offset(start_index)
         .limit(5)
@@ -93,7 +256,7 @@ def get_latest_chats():
     return jsonify({"latest_chats": chats_data}), 200
 
 
-# Route to get the entire chat history for a specific chat ID
+# Route to get the chat history for a specific chat ID, optionally one page at a time
 @chatbot_bp.route('/chat-history', methods=['GET'])
 @jwt_required()
 def get_chat_history():
@@ -101,19 +264,63 @@ def get_chat_history():
     
     if not chat_id:
         return jsonify({"msg": "Chat ID is required"}), 400
+
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, current_app.config['CHAT_HISTORY_MAX_PAGE_SIZE']))
     
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user_id()
     
-    chat = Chat.query.filter_by(chat_id=chat_id, user_id=user.id).first()
+    chat = Chat.query.filter_by(chat_id=chat_id, user_id=user_id).first()
     if not chat:
         return jsonify({"msg": "Chat not found for this user"}), 404
 
-    # Fetch all chat history for the given chat ID
-    chat_history = Message.query.filter_by(chat_id=chat.id).order_by(Message.timestamp).all()
+    # The ETag comes from the latest message and the page parameters only, so an
+    # unchanged chat answers 304 without reading the rest of its messages
+    latest = (
+        Message.query.with_entities(Message.id, Message.timestamp)
+        .filter_by(chat_id=chat.id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .first()
+    )
+    latest_id, latest_timestamp = latest if latest else (None, None)
+    etag = make_etag(chat.id, latest_id, latest_timestamp, after_id, before_id, limit)
+    if is_not_modified(request, etag):
+        return add_validators(current_app.response_class(status=304), etag)
+
+    # Fetch the requested part of the chat history
+    query = history_page(Message.query.filter_by(chat_id=chat.id), Message.id, after_id, before_id, limit)
+    chat_history, has_more = split_history_page(query.all(), after_id, before_id, limit)
     history_data = [
-        {"sender": msg.sender, "content": msg.content, "timestamp": msg.timestamp}
+        {"id": msg.id, "sender": msg.sender, "content": msg.content, "timestamp": msg.timestamp}
         for msg in chat_history
     ]
     
-    return jsonify({"chat_history": history_data}), 200
+    response = jsonify({"chat_history": history_data, "has_more": has_more})
+    return add_validators(response, etag), 200
+
+
+# Route to report the chats, users and call sites that use the most LLM tokens (admins only)
+@chatbot_bp.route('/usage', methods=['GET'])
+@jwt_required()
+def get_usage():
+    user = current_user_info()
+    if not user or user["email"].lower() not in current_app.config['ADMIN_EMAILS']:
+        return jsonify({"msg": "Admin access required"}), 403
+
+    limit = page_size(request.args.get('limit', type=int), 10, 100)
+
+    # Include the calls this worker has not written yet
+    usage_tracker.flush()
+
+    top_chats = usage_totals(LlmUsage.chat_id, limit, exclude='')
+    top_users = usage_totals(LlmUsage.user_id, limit, exclude=0)
+    call_sites = usage_totals(LlmUsage.call_site, limit)
+
+    emails = user_emails([row["key"] for row in top_users])
+    for row in top_users:
+        row["email"] = emails.get(row["key"])
+
+    return jsonify({"top_chats": top_chats, "top_users": top_users, "call_sites": call_sites}), 200
@@ -0,0 +1,130 @@
+# app/chatbot/semantic_cache.py
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    In-process nearest-neighbour cache of answers to general questions.
+
+    Query embeddings are kept L2-normalized in one NumPy matrix, so a lookup is a
+    single matrix-vector product. The index is persisted to an .npz file and thrown
+    away whenever the prompt version it was built for changes.
+    """
+
+    def __init__(self, path, embed_query, prompt_version, threshold=0.92, max_entries=5000, save_every=20):
+        self.path = path
+        self.embed_query = embed_query
+        self.prompt_version = prompt_version
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.save_every = save_every
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._last_used = np.zeros(0)
+        self._queries = []
+        self._answers = []
+        self._unsaved = 0
+
+        self.load()
+
+    def _embed(self, text):
+        vector = np.asarray(self.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query):
+        """Return the cached answer of the most similar question above the threshold, or None."""
+        vector = self._embed(query)
+        with self._lock:
+            if self._vectors is None or not len(self._answers):
+                return None
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            self._last_used[best] = time.time()
+            return json.loads(json.dumps(self._answers[best]))
+
+    def add(self, query, answer):
+        vector = self._embed(query)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector[np.newaxis, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+            self._last_used = np.append(self._last_used, time.time())
+            self._queries.append(query)
+            self._answers.append(answer)
+            self._evict()
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def _evict(self):
+        # Drop the least recently used entries once the index is over its limit
+        overflow = len(self._answers) - self.max_entries
+        if overflow <= 0:
+            return
+        keep = np.sort(np.argsort(self._last_used)[overflow:])
+        self._vectors = self._vectors[keep]
+        self._last_used = self._last_used[keep]
+        self._queries = [self._queries[i] for i in keep]
+        self._answers = [self._answers[i] for i in keep]
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("prompt_version") != self.prompt_version:
+                    # Built for another prompt: start over
+                    os.remove(self.path)
+                    return
+                self._vectors = data["vectors"]
+                self._last_used = data["last_used"]
+                self._queries = meta["queries"]
+                self._answers = meta["answers"]
+        except Exception as e:
+            logger.warning("Could not load semantic cache from %s: %s", self.path, e)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if self._vectors is None:
+                return
+            vectors = self._vectors
+            last_used = self._last_used
+            meta = json.dumps({
+                "prompt_version": self.prompt_version,
+                "queries": self._queries,
+                "answers": self._answers,
+            })
+            self._unsaved = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, vectors=vectors, last_used=last_used, meta=np.array(meta))
+        os.replace(tmp_path, self.path)
+
+
+def create_semantic_cache(path, prompt_version, model="text-embedding-3-small", **kwargs):
+    """Create a SemanticCache backed by OpenAI embeddings and save it on shutdown."""
+    from langchain_openai import OpenAIEmbeddings
+    from app.chatbot.chains import get_http_client
+
+    embeddings = OpenAIEmbeddings(model=model, http_client=get_http_client())
+    cache = SemanticCache(path, embeddings.embed_query, prompt_version, **kwargs)
+    atexit.register(cache.save)
+    return cache
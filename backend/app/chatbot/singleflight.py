@@ -0,0 +1,62 @@
+# app/chatbot/singleflight.py
+import copy
+import threading
+from app.metrics import LLM_COALESCED_CALLS
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function,
+    the others wait for it and get a copy of its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                LLM_COALESCED_CALLS.inc()
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _finish(self, key, call, result=None, error=None):
+        call.result, call.error = result, error
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def _shared(call):
+        if call.error is not None:
+            raise call.error
+        # Callers may modify what they get back, so each one gets its own copy
+        return copy.deepcopy(call.result)
+
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            return self._shared(call)
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, result=copy.deepcopy(result))
+        return result
+
+
+# Shared by every LLM call site in the process
+in_flight = SingleFlight()
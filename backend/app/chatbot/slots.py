@@ -0,0 +1,208 @@
+# app/chatbot/slots.py
+import re
+from typing import Dict, Optional, Tuple
+
+# Rule-based answers to the slot question the assistant asked last. When the user's
+# reply is nothing but the value for that slot ("3", "two visas", "yes", "Dubai"),
+# the value is filled in and the next question is rendered from a template, without
+# calling the model. Anything else returns None and goes to the model as usual.
+
+# Order in which missing parameters are asked for
+SLOT_ORDER = [
+    "no_of_shareholders",
+    "no_of_visas",
+    "activities",
+    "cost",
+    "office_space",
+    "preferred_location",
+]
+
+QUESTIONS = {
+    "no_of_shareholders": "How many shareholders will the company have?",
+    "no_of_visas": "How many residence visas will you need?",
+    "activities": "Which business activities will the company carry out?",
+    "cost": "What is your budget for the company setup, in AED?",
+    "office_space": "Will you need a physical office space?",
+    "preferred_location": "Which emirate would you prefer to set up in?",
+}
+
+ACKNOWLEDGEMENTS = {
+    "no_of_shareholders": "Got it, {value} shareholder(s).",
+    "no_of_visas": "Noted, {value} visa(s).",
+    "cost": "Thanks, a budget of AED {value:,.0f}.",
+    "office_space": "Understood, {value}.",
+    "preferred_location": "Great, {value} it is.",
+}
+
+NUMBER_WORDS = {
+    "zero": 0, "none": 0, "no": 0, "one": 1, "a": 1, "an": 1, "single": 1, "two": 2, "three": 3,
+    "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11,
+    "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
+    "eighteen": 18, "nineteen": 19, "twenty": 20,
+}
+
+YES_WORDS = {"yes", "y", "yeah", "yep", "yup", "sure", "ok", "okay", "definitely", "of course", "i do", "i will", "needed", "required"}
+NO_WORDS = {"no", "n", "nope", "nah", "not needed", "not required", "i don't", "i do not", "i won't", "no need", "none"}
+
+# Emirates and the spellings users type for them
+LOCATIONS = {
+    "dubai": "Dubai",
+    "abu dhabi": "Abu Dhabi",
+    "abudhabi": "Abu Dhabi",
+    "sharjah": "Sharjah",
+    "ajman": "Ajman",
+    "ras al khaimah": "Ras Al Khaimah",
+    "ras al-khaimah": "Ras Al Khaimah",
+    "rak": "Ras Al Khaimah",
+    "fujairah": "Fujairah",
+    "umm al quwain": "Umm Al Quwain",
+    "umm al-quwain": "Umm Al Quwain",
+    "uaq": "Umm Al Quwain",
+}
+
+# The AED is pegged to the US dollar
+AED_PER_USD = 3.6725
+
+# Words that may surround a value without making the answer ambiguous
+FILLER = {
+    "i", "we", "need", "want", "would", "like", "have", "will", "just", "only", "about", "around",
+    "roughly", "approximately", "maybe", "please", "thanks", "thank", "you", "it", "is", "be", "of",
+    "in", "at", "the", "my", "our", "for", "prefer", "preferably", "up", "to",
+}
+
+# Nouns a reply may use for the slot it answers. A noun of another slot ("3 shareholders"
+# in reply to the visa question) is not filler, so such replies go to the model.
+SLOT_NOUNS = {
+    "no_of_shareholders": {"shareholder", "shareholders", "partner", "partners", "owner", "owners"},
+    "no_of_visas": {"visa", "visas", "residence", "employee", "employees"},
+    "cost": {"budget", "total", "max", "maximum"},
+    "office_space": set(),
+    "preferred_location": set(),
+}
+
+# Accepted range of the counts; anything outside is left to the model
+COUNT_BOUNDS = {
+    "no_of_shareholders": (1, 50),
+    "no_of_visas": (0, 100),
+}
+
+# Smallest amount taken as a budget, so a bare "3" or "0" is not read as AED
+MIN_BUDGET_AED = 1_000
+
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "mn": 1_000_000, "million": 1_000_000}
+_COST_PATTERN = re.compile(
+    r"^(?P<pre>aed|dhs?|dirhams?|usd|us\$|\$)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*"
+    r"(?P<mult>k|m|mn|thousand|million)?\s*(?P<post>aed|dhs?|dirhams?|usd|dollars?)?$"
+)
+
+
+def _normalize(text: str) -> str:
+    # Sentence punctuation only: a dot followed by a digit is a decimal point ("1.5m")
+    text = re.sub(r"[!?;]+|\.(?!\d)", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _only_filler(words, slot) -> bool:
+    return all(word in FILLER or word in SLOT_NOUNS[slot] for word in words)
+
+
+def extract_count(text: str, slot: str) -> Optional[int]:
+    """A single count within the slot's bounds, as digits or words, with nothing else but filler words."""
+    words = _normalize(text).replace(",", " ").split()
+    values = [
+        (i, int(word) if word.isdigit() else NUMBER_WORDS[word])
+        for i, word in enumerate(words)
+        if word.isdigit() or word in NUMBER_WORDS
+    ]
+    # "a"/"an" only count when they are the whole answer, otherwise they are articles
+    values = [(i, value) for i, value in values if words[i] not in ("a", "an") or len(words) == 1]
+    if len(values) != 1:
+        return None
+    index, value = values[0]
+    low, high = COUNT_BOUNDS[slot]
+    if not low <= value <= high:
+        return None
+    return value if _only_filler(words[:index] + words[index + 1:], slot) else None
+
+
+def extract_yes_no(text: str, slot: str = "office_space") -> Optional[bool]:
+    normalized = _normalize(text).rstrip(",")
+    for prefix in ("yes", "no"):
+        if normalized.startswith(prefix + ",") or normalized.startswith(prefix + " please"):
+            normalized = prefix
+    if normalized in YES_WORDS:
+        return True
+    if normalized in NO_WORDS:
+        return False
+    return None
+
+
+def extract_cost(text: str, slot: str = "cost") -> Optional[float]:
+    """An amount of at least MIN_BUDGET_AED ("50k", "AED 50,000", "$20,000" converted at the peg)."""
+    words = _normalize(text).split()
+    while words and _only_filler(words[:1], slot):
+        words.pop(0)
+    while words and _only_filler(words[-1:], slot):
+        words.pop()
+    match = _COST_PATTERN.match(" ".join(words))
+    if not match:
+        return None
+    amount = float(match["amount"].replace(",", "")) * _MULTIPLIERS.get(match["mult"], 1)
+    currency = match["pre"] or match["post"] or "aed"
+    if currency.startswith(("usd", "us$", "$", "dollar")):
+        amount *= AED_PER_USD
+    return round(amount, 2) if amount >= MIN_BUDGET_AED else None
+
+
+def extract_location(text: str, slot: str = "preferred_location") -> Optional[str]:
+    normalized = _normalize(text).replace(",", " ")
+    for name in sorted(LOCATIONS, key=len, reverse=True):
+        pattern = rf"(^|\s){re.escape(name)}(\s|$)"
+        if re.search(pattern, normalized):
+            rest = re.sub(pattern, " ", normalized, count=1).split()
+            return LOCATIONS[name] if _only_filler(rest, slot) else None
+    return None
+
+
+EXTRACTORS = {
+    "no_of_shareholders": extract_count,
+    "no_of_visas": extract_count,
+    "cost": extract_cost,
+    "office_space": extract_yes_no,
+    "preferred_location": extract_location,
+}
+
+
+def next_missing_slot(parameters: Dict) -> Optional[str]:
+    return next((slot for slot in SLOT_ORDER if parameters.get(slot) is None), None)
+
+
+def _acknowledge(slot: str, value) -> str:
+    if slot == "office_space":
+        value = "you need an office" if value else "no office needed"
+    return ACKNOWLEDGEMENTS[slot].format(value=value)
+
+
+def fill_pending_slot(
+    user_query: str, pending_slot: Optional[str], collected_parameters: Optional[Dict]
+) -> Optional[Tuple[Optional[str], Dict, Optional[str]]]:
+    """
+    Answer a reply to the pending slot question without the model.
+
+    Returns:
+        tuple: (acknowledgement and next question, or None when every parameter is
+        now collected; updated parameters; next pending slot), or None when the
+        reply is not a plain value for the pending slot.
+    """
+    extractor = EXTRACTORS.get(pending_slot)
+    if extractor is None or len(user_query) > 80:
+        return None
+    value = extractor(user_query, pending_slot)
+    if value is None:
+        return None
+
+    parameters = {**(collected_parameters or {}), pending_slot: value}
+    next_slot = next_missing_slot(parameters)
+    if next_slot is None:
+        return None, parameters, None
+    return f"{_acknowledge(pending_slot, value)} {QUESTIONS[next_slot]}", parameters, next_slot
@@ -0,0 +1,51 @@
+# app/chatbot/stages.py
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.metrics import ASK_STAGE_SECONDS
+
+
+class StageTimer(BaseCallbackHandler):
+    """
+    Records how long the prompt, the model and the output parser of a chain take, as
+    the prompt_render, llm_call and parse stages. Prompts and parsers report their
+    runs with run_type "prompt" and "parser", chat models through on_chat_model_start.
+    """
+
+    # Timing only, cheap enough to run on the caller's thread (or event loop)
+    run_inline = True
+
+    _STAGES = {"prompt": "prompt_render", "parser": "parse"}
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        stage = self._STAGES.get(kwargs.get("run_type"))
+        if stage:
+            self._started[run_id] = (stage, time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = ("llm_call", time.perf_counter())
+
+    def _observe(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started:
+            stage, started_at = started
+            ASK_STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started_at)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._observe(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._observe(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._observe(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._observe(run_id)
+
+
+# Runs are keyed by their unique run id, so one handler serves every request
+stage_timer = StageTimer()
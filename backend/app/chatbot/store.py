@@ -0,0 +1,153 @@
+# app/chatbot/store.py
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from app.models import CatalogDocument, Chat, LlmUsage, Message, Package, User
+
+# INSERT ... ON CONFLICT needs the dialect specific insert construct
+_DIALECT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def dialect_insert(dialect_name, model):
+    return _DIALECT_INSERTS[dialect_name](model)
+
+
+def insert_chat_if_missing(dialect_name, chat_id, user_id, name):
+    """
+    INSERT ... ON CONFLICT (chat_id) DO NOTHING, so two tabs sending the first
+    message of the same chat cannot both try to create it.
+    """
+    return (
+        dialect_insert(dialect_name, Chat)
+        .values(chat_id=chat_id, user_id=user_id, name=name[:255])
+        .on_conflict_do_nothing(index_elements=['chat_id'])
+    )
+
+
+def turn_messages(chat_pk, user_content, received_at, bot_content):
+    # The user message keeps the time it was received, not the time it was saved
+    return [
+        Message(chat_id=chat_pk, sender='user', content=user_content, timestamp=received_at),
+        Message(chat_id=chat_pk, sender='assistant', content=bot_content, timestamp=datetime.utcnow()),
+    ]
+
+
+def find_chat(chat_id, user_id):
+    return Chat.query.filter_by(chat_id=chat_id, user_id=user_id).first()
+
+
+def get_or_create_chat(chat_id, user_id, name):
+    """Return the user's chat, creating it if needed, or None if the chat id belongs to another user."""
+    chat = find_chat(chat_id, user_id)
+    if chat is None:
+        db.session.execute(insert_chat_if_missing(db.session.get_bind().dialect.name, chat_id, user_id, name))
+        chat = find_chat(chat_id, user_id)
+    return chat
+
+
+def save_turn(chat_pk, user_content, received_at, bot_content, parameters=None, pending_slot=None):
+    """Write the user and assistant messages and the chat's parameters in one transaction."""
+    db.session.add_all(turn_messages(chat_pk, user_content, received_at, bot_content))
+    if parameters is not None:
+        db.session.execute(
+            update(Chat).where(Chat.id == chat_pk).values(parameters=parameters, pending_slot=pending_slot)
+        )
+    db.session.commit()
+
+
+def upsert_usage(rows):
+    """Add usage totals to llm_usage, one row per (user, chat, call site, model)."""
+    stmt = dialect_insert(db.engine.dialect.name, LlmUsage).values(rows)
+    counters = ['calls', 'prompt_tokens', 'cached_prompt_tokens', 'completion_tokens', 'latency_ms', 'cost_usd']
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'chat_id', 'call_site', 'model'],
+        set_={
+            **{name: getattr(LlmUsage, name) + getattr(stmt.excluded, name) for name in counters},
+            'updated_at': stmt.excluded.updated_at,
+        },
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+
+
+def usage_totals(column, limit, exclude=None):
+    """Usage summed by `column` (user, chat or call site), most expensive first."""
+    cost = func.sum(LlmUsage.cost_usd)
+    calls = func.sum(LlmUsage.calls)
+    query = db.session.query(
+        column, calls, func.sum(LlmUsage.prompt_tokens), func.sum(LlmUsage.cached_prompt_tokens),
+        func.sum(LlmUsage.completion_tokens), func.sum(LlmUsage.latency_ms), cost,
+    )
+    if exclude is not None:
+        query = query.filter(column != exclude)
+    rows = query.group_by(column).order_by(cost.desc(), calls.desc()).limit(limit).all()
+    return [
+        {
+            "key": key,
+            "calls": int(calls),
+            "prompt_tokens": int(prompt_tokens),
+            "cached_prompt_tokens": int(cached_tokens),
+            "cached_prompt_ratio": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0,
+            "completion_tokens": int(completion_tokens),
+            "avg_latency_ms": round(latency_ms / calls, 1) if calls else 0,
+            "cost_usd": round(cost, 6),
+        }
+        for key, calls, prompt_tokens, cached_tokens, completion_tokens, latency_ms, cost in rows
+    ]
+
+
+def user_emails(user_ids):
+    return dict(User.query.with_entities(User.id, User.email).filter(User.id.in_(user_ids)).all())
+
+
+def catalog_document_exists(content_hash):
+    return db.session.query(CatalogDocument.id).filter_by(content_hash=content_hash).first() is not None
+
+
+def catalog_key_exists(document_key):
+    return db.session.query(CatalogDocument.id).filter_by(document_key=document_key).first() is not None
+
+
+def save_catalog_document(document_key, filename, file_type, content_hash, packages):
+    """
+    Store an uploaded catalog document and its packages in one transaction, replacing
+    the document stored under the same key. Returns the new document id, or None when
+    a document with the same content is stored already.
+    """
+    document_id = db.session.execute(
+        dialect_insert(db.session.get_bind().dialect.name, CatalogDocument)
+        .values(
+            document_key=document_key, filename=filename, file_type=file_type, content_hash=content_hash,
+            package_count=len(packages), created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=['content_hash'])
+        .returning(CatalogDocument.id)
+    ).scalar_one_or_none()
+    if document_id is None:
+        db.session.rollback()
+        return None
+
+    previous = select(CatalogDocument.id).where(CatalogDocument.document_key == document_key, CatalogDocument.id != document_id)
+    db.session.execute(delete(Package).where(Package.document_id.in_(previous)))
+    db.session.execute(delete(CatalogDocument).where(CatalogDocument.id.in_(previous)))
+    if packages:
+        # One executemany for all packages of the document
+        db.session.execute(insert(Package), [{**package, "document_id": document_id} for package in packages])
+    db.session.commit()
+    return document_id
+
+
+def catalog_version():
+    """Changes whenever a catalog document is added or replaced."""
+    count, last_id = db.session.execute(select(func.count(CatalogDocument.id), func.max(CatalogDocument.id))).one()
+    return count, last_id
+
+
+def catalog_packages():
+    """Every stored package with the columns the recommender ranks on."""
+    return db.session.execute(select(
+        Package.freezone, Package.name.label('package'), Package.location, Package.activities, Package.price,
+        Package.renewal_cost, Package.visas, Package.shareholders, Package.office_space,
+    )).mappings().all()
@@ -0,0 +1,104 @@
+# app/chatbot/summary.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from app import db
+from app.models import Chat, Message
+from app.chatbot.chains import register_chain, get_chain
+from app.chatbot.usage import usage_config
+from app.chatbot.history import fit_history, format_history
+
+SUMMARY_PROMPT = PromptTemplate(
+    template=(
+        "You maintain a running summary of a conversation between a user and a freezone assistant.\n"
+        "Update the summary with the new messages below. Keep every detail the user gave about their "
+        "freezone requirements (shareholders, visas, activities, budget, office space, location), any "
+        "suggestions already made and open questions. Keep it short and factual.\n\n"
+        "Current summary:\n{summary}\n\n"
+        "New messages:\n{messages}\n\n"
+        "Updated summary:"
+    ),
+    input_variables=["summary", "messages"],
+)
+
+register_chain("summary", lambda model: SUMMARY_PROMPT | model | StrOutputParser(), temperature=0, model="gpt-4o-mini")
+
+# Summaries are updated off the request thread; one job per chat at a time
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def update_chat_summary(chat_pk, keep_messages, max_tokens):
+    """
+    Fold the messages added since the last summarized message into the chat summary,
+    leaving out the newest `keep_messages` messages that also fit in the history token
+    budget `max_tokens`, so they are still sent verbatim. Whatever the prompt history
+    drops for being over the budget goes into the summary instead.
+
+    Only the new messages are sent to the model, so the cost of an update does not grow
+    with the length of the chat.
+    """
+    chat = db.session.get(Chat, chat_pk)
+    if not chat:
+        db.session.rollback()
+        return
+
+    summary, summary_message_id = chat.summary, chat.summary_message_id
+    user_id, chat_id = chat.user_id, chat.chat_id
+    pending = (
+        Message.query.filter(Message.chat_id == chat_pk, Message.id > (summary_message_id or 0))
+        .order_by(Message.id)
+        .all()
+    )
+    turns = [
+        (msg.id, {"role": "user" if msg.sender == "user" else "assistant", "content": msg.content})
+        for msg in pending
+    ]
+    recent = [turn for _, turn in turns[len(turns) - keep_messages:]] if keep_messages > 0 else []
+    to_fold = turns[:len(turns) - len(fit_history(recent, max_tokens))]
+
+    # End the read transaction so no connection is held while the model is generating
+    db.session.rollback()
+    if not to_fold:
+        return
+
+    new_summary = get_chain("summary").invoke({
+        "summary": summary or "(empty)",
+        "messages": format_history([turn for _, turn in to_fold]),
+    }, config=usage_config("chat_summary", user_id, chat_id))
+
+    # Only apply the update if nobody else moved the summary forward meanwhile
+    Chat.query.filter(
+        Chat.id == chat_pk,
+        Chat.summary_message_id.is_(None) if summary_message_id is None
+        else Chat.summary_message_id == summary_message_id,
+    ).update(
+        {"summary": new_summary, "summary_message_id": to_fold[-1][0]},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def _run_summary_update(app, chat_pk):
+    try:
+        with app.app_context():
+            update_chat_summary(
+                chat_pk, app.config['CHAT_SUMMARY_KEEP_MESSAGES'], app.config['CHAT_HISTORY_TOKEN_BUDGET'],
+            )
+    except Exception as e:
+        app.logger.error(f"Error updating summary for chat {chat_pk}: {str(e)}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(chat_pk)
+
+
+def schedule_summary_update(app, chat_pk):
+    """Queue a background summary update for the chat unless one is already running."""
+    with _in_flight_lock:
+        if chat_pk in _in_flight:
+            return
+        _in_flight.add(chat_pk)
+    _executor.submit(_run_summary_update, app, chat_pk)
@@ -0,0 +1,51 @@
+# app/chatbot/test_prompt_prefix.py
+import pytest
+
+from app.chatbot.utils import ASK_PROMPT, ASK_SYSTEM_PROMPT, build_chain_inputs
+
+# Appended to the per-request text, must never show up in the static prefix
+MARKER = "prefix-check-marker"
+
+CONVERSATIONS = [
+    ("hi", [], None, None),
+    ("What is a freezone?", [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "Hi! How can I help?"}], None, None),
+    ("3 visas please", [
+        {"role": "user", "content": "I want to open a trading company"},
+        {"role": "assistant", "content": "Great, how many shareholders will it have?"},
+        {"role": "user", "content": "two"},
+        {"role": "assistant", "content": "And how many visas do you need?"},
+    ], "The user wants a trading company.", {"no_of_shareholders": 2, "activities": "trading"}),
+]
+
+
+def render(query, history, summary, parameters):
+    return ASK_PROMPT.format_messages(**build_chain_inputs(query, history, summary, parameters))
+
+
+def mark(query, history, summary, parameters):
+    history = [{**turn, "content": f"{turn['content']} {MARKER}"} for turn in history]
+    return f"{query} {MARKER}", history, f"{summary or ''} {MARKER}", parameters
+
+
+@pytest.mark.parametrize("conversation", CONVERSATIONS)
+def test_prompt_starts_with_static_system_prompt(conversation):
+    first = render(*mark(*conversation))[0]
+    assert first.type == "system"
+    assert first.content == ASK_SYSTEM_PROMPT
+    assert MARKER not in first.content
+
+
+def test_prefix_is_byte_identical_across_requests():
+    prefixes = {render(*conversation)[0].content.encode("utf-8") for conversation in CONVERSATIONS}
+    assert len(prefixes) == 1
+
+
+def test_next_turn_extends_the_previous_history():
+    query, history, summary, parameters = CONVERSATIONS[2]
+    turn = render(query, history, summary, parameters)
+    next_turn = render("yes, I need an office", history + [
+        {"role": "user", "content": query}, {"role": "assistant", "content": "Noted. Do you need office space?"},
+    ], summary, {**parameters, "no_of_visas": 3})
+    # The system prompt and the earlier history messages are unchanged, only new turns follow
+    shared = 1 + len(history)
+    assert [(m.type, m.content) for m in turn[:shared]] == [(m.type, m.content) for m in next_turn[:shared]]
@@ -0,0 +1,96 @@
+# app/chatbot/test_slots.py
+import pytest
+
+from app.chatbot.slots import extract_cost, extract_count, extract_location, extract_yes_no, fill_pending_slot
+
+
+@pytest.mark.parametrize("slot, reply, expected", [
+    ("no_of_shareholders", "3", 3),
+    ("no_of_shareholders", "two shareholders", 2),
+    ("no_of_shareholders", "I need 2 partners please", 2),
+    ("no_of_visas", "No visas", 0),
+    ("no_of_visas", "5 employees", 5),
+])
+def test_count(slot, reply, expected):
+    assert extract_count(reply, slot) == expected
+
+
+@pytest.mark.parametrize("slot, reply", [
+    # Another slot's noun: the model decides what the user meant
+    ("no_of_visas", "3 shareholders"),
+    ("no_of_shareholders", "two visas"),
+    # Out of bounds: a company has at least one shareholder
+    ("no_of_shareholders", "no"),
+    ("no_of_shareholders", "none"),
+    ("no_of_shareholders", "0"),
+    ("no_of_visas", "5000"),
+    # Ambiguous or not a count
+    ("no_of_shareholders", "3 or 4"),
+    ("no_of_shareholders", "what is a shareholder?"),
+    ("no_of_visas", "a visa"),
+])
+def test_count_falls_through(slot, reply):
+    assert extract_count(reply, slot) is None
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("50k", 50_000),
+    ("AED 50,000", 50_000),
+    ("around 100 thousand dirhams", 100_000),
+    ("$20,000", 73_450),
+    ("budget 5000", 5_000),
+    ("1.5m aed", 1_500_000),
+    ("AED 12,500.50", 12_500.5),
+    ("2.5k", 2_500),
+    ("$1.5k", 5_508.75),
+    ("50k.", 50_000),
+])
+def test_cost(reply, expected):
+    assert extract_cost(reply) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("reply", ["0", "3", "AED 500", "cheap", "3 visas", "50k or 60k"])
+def test_cost_falls_through(reply):
+    assert extract_cost(reply) is None
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("yes", True), ("Yes, please", True), ("no", False), ("nope", False), ("what is it", None),
+])
+def test_yes_no(reply, expected):
+    assert extract_yes_no(reply) is expected
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("Dubai", "Dubai"),
+    ("I prefer RAK", "Ras Al Khaimah"),
+    ("abu dhabi please", "Abu Dhabi"),
+    ("dubai or sharjah", None),
+    ("dubai 3 visas", None),
+])
+def test_location(reply, expected):
+    assert extract_location(reply) == expected
+
+
+def test_fill_asks_next_missing_slot():
+    reply, parameters, next_slot = fill_pending_slot("3", "no_of_shareholders", {"activities": "trading"})
+    assert parameters == {"activities": "trading", "no_of_shareholders": 3}
+    assert next_slot == "no_of_visas"
+    assert reply.endswith("How many residence visas will you need?")
+
+
+def test_fill_last_slot_leaves_reply_to_suggestion():
+    collected = {"no_of_shareholders": 1, "no_of_visas": 2, "activities": "trading", "cost": 20_000.0, "office_space": False}
+    assert fill_pending_slot("Dubai", "preferred_location", collected) == (None, {**collected, "preferred_location": "Dubai"}, None)
+
+
+@pytest.mark.parametrize("reply, pending_slot", [
+    ("3 shareholders", "no_of_visas"),
+    ("two visas", "no_of_shareholders"),
+    ("no", "no_of_shareholders"),
+    ("3", "cost"),
+    ("trading", "activities"),
+    ("3", None),
+])
+def test_fill_falls_through_to_the_model(reply, pending_slot):
+    assert fill_pending_slot(reply, pending_slot, {}) is None
@@ -0,0 +1,167 @@
+# app/chatbot/usage.py
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.metrics import LLM_CACHED_PROMPT_TOKENS, LLM_PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# USD per million tokens: (prompt, cached prompt, completion), overridden by LLM_PRICES
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+
+def extract_usage(response):
+    """
+    Token counts of an LLM result as (prompt, cached prompt, completion). Reads the
+    message usage metadata first (also set on streamed results) and falls back to the
+    provider's token_usage.
+    """
+    prompt = cached = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    if prompt or completion:
+        return prompt, cached, completion
+
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+    return token_usage.get("prompt_tokens", 0), cached, token_usage.get("completion_tokens", 0)
+
+
+class UsageTracker:
+    """
+    Aggregates token counts, latency and cost per (user, chat, call site, model) in
+    memory and upserts the totals into llm_usage every few seconds, so recording a
+    call never adds a database write to the request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._app = None
+        self._prices = dict(DEFAULT_PRICES)
+        self._thread = None
+
+    def configure(self, app, prices, flush_interval):
+        self._app = app
+        self._prices = {**DEFAULT_PRICES, **prices}
+        if self._thread is None and flush_interval > 0:
+            self._thread = threading.Thread(
+                target=self._flush_forever, args=(flush_interval,), name="llm-usage-flush", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def cost(self, model, prompt_tokens, cached_tokens, completion_tokens):
+        # Versioned model names (gpt-4o-mini-2024-07-18) are priced like their base model
+        prices = next(
+            (self._prices[name] for name in sorted(self._prices, key=len, reverse=True) if (model or "").startswith(name)),
+            None,
+        )
+        if prices is None:
+            return 0.0
+        prompt_price, cached_price, completion_price = prices
+        return (
+            (prompt_tokens - cached_tokens) * prompt_price
+            + cached_tokens * cached_price
+            + completion_tokens * completion_price
+        ) / 1_000_000
+
+    def record(self, user_id, chat_id, call_site, model, prompt_tokens, cached_tokens, completion_tokens, latency):
+        key = (int(user_id or 0), chat_id or "", call_site, model or "")
+        cost = self.cost(model, prompt_tokens, cached_tokens, completion_tokens)
+        LLM_PROMPT_TOKENS.labels(call_site=call_site).inc(prompt_tokens)
+        LLM_CACHED_PROMPT_TOKENS.labels(call_site=call_site).inc(cached_tokens)
+        with self._lock:
+            totals = self._pending.setdefault(key, [0, 0, 0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += cached_tokens
+            totals[3] += completion_tokens
+            totals[4] += int(latency * 1000)
+            totals[5] += cost
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._app is None:
+            return
+
+        from app.chatbot.store import upsert_usage
+        try:
+            with self._app.app_context():
+                upsert_usage([
+                    {
+                        "user_id": user_id, "chat_id": chat_id, "call_site": call_site, "model": model,
+                        "calls": calls, "prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached_tokens,
+                        "completion_tokens": completion_tokens, "latency_ms": latency_ms, "cost_usd": cost,
+                        "updated_at": datetime.utcnow(),
+                    }
+                    for (user_id, chat_id, call_site, model), (calls, prompt_tokens, cached_tokens, completion_tokens, latency_ms, cost)
+                    in pending.items()
+                ])
+        except Exception as e:
+            logger.error("Could not write LLM usage: %s", e)
+            # Keep the totals for the next attempt
+            with self._lock:
+                for key, totals in pending.items():
+                    current = self._pending.setdefault(key, [0, 0, 0, 0, 0, 0.0])
+                    for i, value in enumerate(totals):
+                        current[i] += value
+
+    def _flush_forever(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+
+usage_tracker = UsageTracker()
+
+
+def init_usage_tracking(app):
+    usage_tracker.configure(app, app.config['LLM_PRICES'], app.config['USAGE_FLUSH_INTERVAL'])
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Records the tokens and latency of every model call made with this handler."""
+
+    run_inline = True
+
+    def __init__(self, call_site, user_id=0, chat_id=""):
+        self.call_site = call_site
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._started[run_id] = (time.perf_counter(), params.get("model") or params.get("model_name"))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started_at, model = self._started.pop(run_id, (time.perf_counter(), None))
+        model = (response.llm_output or {}).get("model_name") or model
+        prompt_tokens, cached_tokens, completion_tokens = extract_usage(response)
+        usage_tracker.record(
+            self.user_id, self.chat_id, self.call_site, model,
+            prompt_tokens, cached_tokens, completion_tokens, time.perf_counter() - started_at,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started_at, model = self._started.pop(run_id, (time.perf_counter(), None))
+        usage_tracker.record(self.user_id, self.chat_id, self.call_site, model, 0, 0, 0, time.perf_counter() - started_at)
+
+
+# LangChain run config that records usage for the given call site, user and chat
+def usage_config(call_site, user_id=0, chat_id="", callbacks=()):
+    return {"callbacks": [*callbacks, UsageCallback(call_site, user_id, chat_id)]}
@@ -1,12 +1,27 @@
+import hashlib
 import json
-from typing import List, Dict, Optional
+import logging
+import os
+from typing import Any, Iterator, List, Dict, Literal, Optional, Tuple
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from app.chatbot.chains import register_chain, get_chain, get_chain_model, strict_json_schema
+from app.chatbot.cache import make_cache_key, response_cache
+from app.chatbot.singleflight import in_flight
+from app.chatbot.semantic_cache import create_semantic_cache
+from app.chatbot.history import history_messages
+from app.chatbot.slots import SLOT_ORDER, fill_pending_slot
+from app.chatbot.recommend import recommend
+from app.chatbot.stages import stage_timer
+from app.chatbot.usage import usage_config
+from app.metrics import ASK_CACHE_HITS, ASK_CACHE_MISSES, ASK_FAST_PATH, track_stage
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Define the desired data structure with the 'all_parameters_collected' flag
 from typing import Optional
 from pydantic import BaseModel, Field
@@ -46,6 +61,10 @@ class UserInputResponse(BaseModel):
     )
     response: str = Field(..., description="The chatbot's response to the user.")
     all_parameters_collected: bool = Field(default=False, description="Flag indicating if all parameters have been collected from the user.")
+    asked_parameter: Optional[Literal[tuple(SLOT_ORDER)]] = Field(
+        default=None,
+        description="The parameter the response asks the user for, or null if it does not ask for one."
+    )
 
 
 
@@ -64,92 +83,334 @@ def give_suggestion(
     Returns:
         str: A suggestion based on the collected parameters.
     """
-    # Convert parameters to dictionary and access values
-    # parameters_dict = parameters.dict()
-
-    return (
+    summary = (
         f"Thank you for providing all the details. Based on your input:\n"
-        f"- Number of shareholders: {parameters['no_of_shareholders']}\n"
-        f"- Number of visas: {parameters['no_of_visas']}\n"
-        f"- Activities: {parameters['activities']}\n"
-        f"- Cost: {parameters['cost']}\n"
-        f"- Office space: {'Yes' if parameters['office_space'] else 'No'}\n"
-        f"- Preferred location: {parameters['preferred_location']}\n\n"
-        "I suggest the following freezones: Freezone A, Freezone B, Freezone C."
+        f"- Number of shareholders: {parameters.get('no_of_shareholders')}\n"
+        f"- Number of visas: {parameters.get('no_of_visas')}\n"
+        f"- Activities: {parameters.get('activities')}\n"
+        f"- Cost: {parameters.get('cost')}\n"
+        f"- Office space: {'Yes' if parameters.get('office_space') else 'No'}\n"
+        f"- Preferred location: {parameters.get('preferred_location')}\n\n"
+    )
+
+    # Packages ranked from the freezone catalog
+    packages = recommend(parameters)
+    if not packages:
+        return summary + "I could not find freezone packages to compare right now, please check back later."
+
+    lines = [
+        f"{rank}. {package['freezone']} - {package['package']} (AED {package['price']:,.0f})"
+        + (f": {', '.join(package['reasons'])}" if package['reasons'] else "")
+        for rank, package in enumerate(packages, start=1)
+    ]
+    return summary + "I suggest the following freezone packages:\n" + "\n".join(lines)
+
+
+# The /ask reply schema goes through the model's native structured output channel
+# (strict JSON schema) instead of being spelled out in the prompt
+ASK_RESPONSE_SCHEMA = strict_json_schema(UserInputResponse)
+ASK_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "user_input_response", "strict": True, "schema": ASK_RESPONSE_SCHEMA},
+}
+
+# The output parser and prompt for the /ask chain are built once at import time.
+# The parser still parses the JSON text, which also gives the partial objects used
+# for streaming.
+ASK_PARSER = JsonOutputParser(pydantic_object=UserInputResponse)
+
+# The prompt is laid out for provider-side prefix caching: the static instructions come
+# first as a byte-stable system message, followed by the history (which only grows at
+# the end between turns), the per-turn state and the query. Nothing dynamic may be
+# added to ASK_SYSTEM_PROMPT, test_prompt_prefix.py checks that it stays stable.
+ASK_SYSTEM_PROMPT = (
+    "You are a helpful assistant. Process the user's query and respond with a JSON object "
+    "that follows the response schema.\n\n"
+    
+    "You are a helpful assistant. Your task is to guide the user through a series of "
+    "questions to collect details about their freezone requirements and eventually suggest the best freezones. "
+    "You will process the user's query and respond with a JSON structure containing the response and status of "
+    "collected parameters.\n\n"
+
+    "Instructions:\n"
+    "1. If the query is general, respond directly and move on to the next step.\n"
+    "2. If the query relates to freezones, check the user's provided information in the chat history. "
+    "The parameters you need to collect are: 'No of shareholders', 'No of visas', 'Activities', 'Cost', "
+    "'Office space', and 'Preferred location'. These parameters are optional initially.\n"
+    "3. If any of the parameters are missing, ask the user for one missing parameter at a time in a conversational "
+    "manner.\n"
+    "4. Only when **all** parameters ('No of shareholders', 'No of visas', 'Activities', 'Cost', 'Office space', and 'Preferred location') "
+    "are provided should you set the flag `all_parameters_collected` to `True`.\n"
+    "5. If all parameters are collected, suggest appropriate freezones based on the user's input. The assistant should "
+    "suggest the best freezones by referencing the parameters the user provided.\n"
+    "6. After suggesting the freezones, reset the parameter collection status to `False` so that the assistant can be ready "
+    "to collect new parameters from the next user request.\n"
+    "7. If any parameters are missing, the assistant should respond with which specific parameter is still needed. "
+    "Repeat this until all parameters are collected.\n"
+    "8. Set `asked_parameter` to the parameter your response asks the user for, or null if it asks for none.\n"
+    "\nThe parameters already collected, the summary of the earlier conversation and the chat history "
+    "are given after these instructions, the user's latest query comes last.\n\n"
+    "Your task is to:\n"
+    "1. If all required parameters are collected, set `all_parameters_collected` to `True` and if the suggestion is already provided in the chat then set it to null and manage it accordingly"
+    "2. If parameters are missing, prompt the user for the missing ones one at a time."
+    "3. Return the structured response in JSON format with the appropriate information."
+    "note : always make sure all the fields are filled before setting the flag to true"
+    "see i want you to understand that what you give all_parameters_collected as true along with the parameters then i will use these parameters to call another tool to give suggestions bsed on these parameters so when you give it as true you do not need to give response (but always remember do this only when the flag is false otherwise give back a response under no circumstances are you allowed to do but the is you can never set the flag to false and not returning the response i repeat never) got it also understand this workflow so that you can work better next time"
+    "you can never ever do this 'response': None, 'all_parameters_collected': False, got it,    if all the parameters are received and the user is asking for suggestion then set the flag to true otherwise under reply properly and accordingly"
+    "also see in the chat history if the suggestion is already given in the current context then set the flag to falso and reply accordingly"
+    "keep in mind the datatype for the user's input in the user gives meaningless input then explain to them what you are asking and what type of inpyt you require"
+)
+
+ASK_STATE_TEMPLATE = (
+    "Parameters already collected from the user (null means not given yet; trust these values "
+    "and never ask for them again unless the user changes them):\n{collected_parameters}\n\n"
+    "Summary of the earlier conversation:\n{summary}"
+)
+
+ASK_PROMPT = ChatPromptTemplate.from_messages([
+    SystemMessage(content=ASK_SYSTEM_PROMPT),
+    MessagesPlaceholder("chat_history"),
+    ("system", ASK_STATE_TEMPLATE),
+    ("human", "{query}"),
+])
+
+# Changes whenever the prompt text or the response schema changes
+ASK_PROMPT_VERSION = hashlib.sha256(
+    (ASK_SYSTEM_PROMPT + ASK_STATE_TEMPLATE + json.dumps(ASK_RESPONSE_SCHEMA, sort_keys=True)).encode("utf-8")
+).hexdigest()[:12]
+
+# Register the prompt | model | parser chain so it is compiled once per process
+register_chain(
+    "ask",
+    lambda model: ASK_PROMPT | model.bind(response_format=ASK_RESPONSE_FORMAT) | ASK_PARSER,
+    temperature=0,
+    model="gpt-4o-mini",
+)
+
+
+# Validate the parsed /ask output against the response model, so a malformed reply
+# fails here instead of being cached or saved
+def validate_result(result) -> Dict:
+    return UserInputResponse.model_validate(result).model_dump()
+
+
+# The /ask chain runs at temperature 0, so identical inputs can be answered from the cache
+def ask_cache_key(chain_inputs: Dict[str, Any]) -> str:
+    return make_cache_key(ASK_PROMPT_VERSION, get_chain_model("ask"), chain_inputs)
+
+
+def is_cacheable(result) -> bool:
+    return isinstance(result, dict) and bool(result.get("response") or result.get("all_parameters_collected"))
+
+
+# Semantic cache of answers to general first-turn questions, created by init_faq_cache
+faq_cache = None
+
+
+def init_faq_cache(app):
+    global faq_cache
+    if not app.config['SEMANTIC_CACHE_ENABLED']:
+        faq_cache = None
+        return
+    faq_cache = create_semantic_cache(
+        os.path.join(app.config['SEMANTIC_CACHE_DIR'], "ask.npz"),
+        ASK_PROMPT_VERSION,
+        model=app.config['SEMANTIC_CACHE_EMBEDDING_MODEL'],
+        threshold=app.config['SEMANTIC_CACHE_THRESHOLD'],
+        max_entries=app.config['SEMANTIC_CACHE_MAX_ENTRIES'],
     )
 
 
+# A general question is the opening of a chat: nothing was answered or collected yet
+def is_general_question(chat_history: List[Dict[str, str]], summary: Optional[str], collected_parameters: Optional[Dict]) -> bool:
+    has_collected = any(value is not None for value in (collected_parameters or {}).values())
+    return not summary and not has_collected and all(turn["role"] == "user" for turn in chat_history)
+
+
+def _count_lookup(cache: str, result) -> None:
+    (ASK_CACHE_MISSES if result is None else ASK_CACHE_HITS).labels(cache=cache).inc()
+
+
+def get_cached_result(cache_key: str, user_query: str, general_question: bool) -> Optional[Dict]:
+    result = response_cache.get(cache_key)
+    _count_lookup("response", result)
+    if result is None and general_question and faq_cache is not None:
+        try:
+            result = faq_cache.lookup(user_query)
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+        _count_lookup("semantic", result)
+    return result
+
+
+def store_result(cache_key: str, result: Dict, user_query: str, general_question: bool) -> None:
+    if not is_cacheable(result):
+        return
+    response_cache.set(cache_key, result)
+
+    # Only answers that did not pick up any parameter are safe to reuse for similar questions
+    parameters = result.get("parameters") or {}
+    if (
+        general_question
+        and faq_cache is not None
+        and not result.get("all_parameters_collected")
+        and all(value is None for value in parameters.values())
+    ):
+        try:
+            faq_cache.add(user_query, result)
+        except Exception as e:
+            logger.warning("Semantic cache update failed: %s", e)
+
+
+# Build the variables passed to the /ask chain
+def build_chain_inputs(
+    user_query: str,
+    chat_history: List[Dict[str, str]],
+    summary: Optional[str] = None,
+    collected_parameters: Optional[Dict] = None,
+) -> Dict[str, Any]:
+    return {
+        "query": user_query,
+        "chat_history": history_messages(chat_history),
+        "summary": summary or "(none)",
+        "collected_parameters": json.dumps(
+            {field: (collected_parameters or {}).get(field) for field in FreezoneParameters.model_fields},
+            separators=(",", ":"),
+        ),
+    }
+
+
+# Merge the parameters parsed from the latest response into the ones collected so far
+def merge_parameters(collected_parameters: Optional[Dict], parsed_parameters: Optional[Dict]) -> Dict:
+    merged = dict(collected_parameters or {})
+    for field, value in (parsed_parameters or {}).items():
+        if field in FreezoneParameters.model_fields and value not in (None, ""):
+            merged[field] = value
+    return merged
+
+
+# Turn the parsed chain output into the text that is sent back to the user, the
+# updated parameter state of the chat and the parameter the reply asks for
+def finalize_result(
+    result: Dict, user_query: str, chat_history: List[Dict[str, str]], collected_parameters: Optional[Dict] = None
+) -> Tuple[str, Dict, Optional[str]]:
+    logger.debug("Assistant result: %s", result)
+    parameters = merge_parameters(collected_parameters, result.get("parameters"))
+    if result["all_parameters_collected"]:
+        # Call the suggestion giver function if the flag is True
+        with track_stage("give_suggestion"):
+            suggestion = give_suggestion(
+                parameters=parameters, 
+                user_query=user_query, 
+                chat_history=chat_history
+            )
+        return suggestion, parameters, None
+    return result['response'] or "some error occured unable to fetch", parameters, result.get("asked_parameter")
+
+
+# Answer a plain reply to the parameter the assistant asked for ("3", "yes", "Dubai")
+# with the rule-based extractor and a templated follow-up question, without the model.
+# The routes try this before waiting for a model slot.
+def answer_pending_slot(
+    user_query: str, chat_history: List[Dict[str, str]], pending_slot: Optional[str], collected_parameters: Optional[Dict]
+) -> Optional[Tuple[str, Dict, Optional[str]]]:
+    if pending_slot is None:
+        return None
+    with track_stage("fast_path"):
+        filled = fill_pending_slot(user_query, pending_slot, collected_parameters)
+    if filled is None:
+        return None
+    ASK_FAST_PATH.labels(slot=pending_slot).inc()
+
+    response, parameters, next_slot = filled
+    if response is None:
+        with track_stage("give_suggestion"):
+            response = give_suggestion(parameters=parameters, user_query=user_query, chat_history=chat_history)
+    return response, parameters, next_slot
+
+
 # Function to process user input
-def process_user_input(user_query: str, chat_history: List[Dict[str, str]]) -> Dict:
+def process_user_input(
+    user_query: str,
+    chat_history: List[Dict[str, str]],
+    summary: Optional[str] = None,
+    collected_parameters: Optional[Dict] = None,
+    user_id: int = 0,
+    chat_id: str = "",
+) -> Tuple[str, Dict, Optional[str]]:
     """
-    Process user input and return a structured JSON response using LangChain.
+    Process user input using LangChain and return the reply together with the
+    freezone parameters collected so far and the parameter the reply asks for.
     """
-    # Initialize the model
-    model = ChatOpenAI(temperature=0, model="gpt-4o-mini")
-
-    # Define the output parser
-    parser = JsonOutputParser(pydantic_object=UserInputResponse)
-
-    # Build the prompt template
-    prompt = PromptTemplate(
-        template=(
-            "You are a helpful assistant. Process the user's query and respond in JSON format "
-            "using the following structure:\n"
-            "{format_instructions}\n\n"
-            
-            "You are a helpful assistant. Your task is to guide the user through a series of "
-            "questions to collect details about their freezone requirements and eventually suggest the best freezones. "
-            "You will process the user's query and respond with a JSON structure containing the response and status of "
-            "collected parameters.\n\n"
-
-            "Instructions:\n"
-            "1. If the query is general, respond directly and move on to the next step.\n"
-            "2. If the query relates to freezones, check the user's provided information in the chat history. "
-            "The parameters you need to collect are: 'No of shareholders', 'No of visas', 'Activities', 'Cost', "
-            "'Office space', and 'Preferred location'. These parameters are optional initially.\n"
-            "3. If any of the parameters are missing, ask the user for one missing parameter at a time in a conversational "
-            "manner.\n"
-            "4. Only when **all** parameters ('No of shareholders', 'No of visas', 'Activities', 'Cost', 'Office space', and 'Preferred location') "
-            "are provided should you set the flag `all_parameters_collected` to `True`.\n"
-            "5. If all parameters are collected, suggest appropriate freezones based on the user's input. The assistant should "
-            "suggest the best freezones by referencing the parameters the user provided.\n"
-            "6. After suggesting the freezones, reset the parameter collection status to `False` so that the assistant can be ready "
-            "to collect new parameters from the next user request.\n"
-            "7. If any parameters are missing, the assistant should respond with which specific parameter is still needed. "
-            "Repeat this until all parameters are collected.\n"
-            
-            "\nChat history:\n{chat_history}\n\n"
-            "User query:\n{query}\n\n"
-            "Your task is to:\n"
-            "1. If all required parameters are collected, set `all_parameters_collected` to `True` and if the suggestion is already provided in the chat then set it to null and manage it accordingly"
-            "2. If parameters are missing, prompt the user for the missing ones one at a time."
-            "3. Return the structured response in JSON format with the appropriate information."
-            "note : always make sure all the fields are filled before setting the flag to true"
-            "see i want you to understand that what you give all_parameters_collected as true along with the parameters then i will use these parameters to call another tool to give suggestions bsed on these parameters so when you give it as true you do not need to give response (but always remember do this only when the flag is false otherwise give back a response under no circumstances are you allowed to do but the is you can never set the flag to false and not returning the response i repeat never) got it also understand this workflow so that you can work better next time"
-            "you can never ever do this 'response': None, 'all_parameters_collected': False, got it,    if all the parameters are received and the user is asking for suggestion then set the flag to true otherwise under reply properly and accordingly"
-            "also see in the chat history if the suggestion is already given in the current context then set the flag to falso and reply accordingly"
-            "keep in mind the datatype for the user's input in the user gives meaningless input then explain to them what you are asking and what type of inpyt you require"
-            ""
-        ),
-        input_variables=["query", "chat_history"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
+    chain_inputs = build_chain_inputs(user_query, chat_history, summary, collected_parameters)
+    cache_key = ask_cache_key(chain_inputs)
+    general_question = is_general_question(chat_history, summary, collected_parameters)
 
-    # Create a chain by combining the prompt, model, and parser
-    chain = prompt | model | parser
+    with track_stage("cache_lookup"):
+        result = get_cached_result(cache_key, user_query, general_question)
+    if result is None:
+        # Invoke the chain with the user query and chat history. A duplicate of a request
+        # that is still running (double click, client retry) waits for it instead.
+        config = usage_config("ask", user_id, chat_id, callbacks=[stage_timer])
+        result = in_flight.do(cache_key, invoke_ask, cache_key, chain_inputs, user_query, general_question, config)
+    return finalize_result(result, user_query, chat_history, collected_parameters)
 
-    # Invoke the chain with the user query and chat history
-    result = chain.invoke({"query": user_query, "chat_history": str(chat_history)})
-    print(f"\nAssistant result  : {result}")
-    if result["all_parameters_collected"]:
-        print(f"\n  {type(result['parameters'])}  Assistant Suggestion: {result['parameters']}")
 
-        # Call the suggestion giver function if the flag is True
-        suggestion = give_suggestion(
-            parameters=result["parameters"], 
-            user_query=user_query, 
-            chat_history=chat_history
-        )
-        print(f"\nAssistant Suggestionnnnnn    : {suggestion}")
-        return suggestion
-    return result['response'] or "some error occured unable to fetch"
+def invoke_ask(cache_key: str, chain_inputs: Dict[str, Any], user_query: str, general_question: bool, config: Dict) -> Dict:
+    result = validate_result(get_chain("ask").invoke(chain_inputs, config=config))
+    store_result(cache_key, result, user_query, general_question)
+    return result
+
+
+# Function to stream the response to user input
+def stream_user_input(
+    user_query: str,
+    chat_history: List[Dict[str, str]],
+    summary: Optional[str] = None,
+    collected_parameters: Optional[Dict] = None,
+    user_id: int = 0,
+    chat_id: str = "",
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the chatbot's reply while the model is still generating it.
+
+    The JsonOutputParser emits the partially parsed JSON object on every chunk, so
+    only the growing `response` field is diffed against what was already sent.
+
+    Yields:
+        tuple: ("token", delta) for every new piece of the response text, then
+        ("parameters", dict) with the updated parameter state, ("pending_slot", name)
+        with the parameter the reply asks for and a single ("final", text) with the
+        complete reply (or the suggestion).
+    """
+    chain_inputs = build_chain_inputs(user_query, chat_history, summary, collected_parameters)
+    cache_key = ask_cache_key(chain_inputs)
+    general_question = is_general_question(chat_history, summary, collected_parameters)
+
+    with track_stage("cache_lookup"):
+        result = get_cached_result(cache_key, user_query, general_question)
+    if result is not None:
+        # Cached answers are complete already, send them as a single chunk
+        if result.get("response"):
+            yield "token", result["response"]
+    else:
+        sent = ""
+        for partial in get_chain("ask").stream(chain_inputs, config=usage_config("ask", user_id, chat_id)):
+            if not isinstance(partial, dict):
+                continue
+            result = partial
+            text = partial.get("response")
+            if not isinstance(text, str) or len(text) <= len(sent) or not text.startswith(sent):
+                continue
+            yield "token", text[len(sent):]
+            sent = text
+
+        if result is None:
+            raise ValueError("The model returned no parsable output")
+
+        result = validate_result(result)
+        store_result(cache_key, result, user_query, general_question)
+    response, parameters, next_slot = finalize_result(result, user_query, chat_history, collected_parameters)
+    yield "parameters", parameters
+    yield "pending_slot", next_slot
+    yield "final", response
@@ -1,4 +1,5 @@
 from dotenv import load_dotenv
+import json
 import os
 
 # Load .env file
@@ -20,11 +21,88 @@ class Config:
     DB_PORT = os.environ.get("DB_PORT", 5432)
     DB_NAME = os.environ.get("DB_NAME", "your_db_name")
 
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # DATABASE_URL overrides the Postgres settings above, e.g. with
+    # a SQLite file for local runs and load tests
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+
+    # Database connection pool
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))      # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))      # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))  # 0 disables
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() == "true"  # PgBouncer in transaction pooling mode
+
 
     JWT_TOKEN_LOCATION = ["cookies"]  # Store JWT in cookies
     JWT_COOKIE_SECURE = False         # Set to True in production
     JWT_COOKIE_CSRF_PROTECT = False   # CSRF protection (disable for now during development)
     JWT_ACCESS_COOKIE_NAME = "access_token"
+
+    # Per-process cache of user rows for tokens without identity claims
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 300))  # seconds
+
+    # Password hashing, done in a process pool. Include the cost parameters in the
+    # method: stored hashes made with another method or cost are upgraded at login.
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", 8))    # jobs waiting for a worker
+    PASSWORD_HASH_QUEUE_WAIT = float(os.environ.get("PASSWORD_HASH_QUEUE_WAIT", 0.5))  # seconds before answering 503
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))         # seconds
+
+    # OpenAI HTTP client pool (shared by every chain in the process)
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 20))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", 60))  # seconds
+    OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 60))                    # seconds
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 5))     # seconds
+    OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 2))
+
+    # Chat history sent with each /ask prompt
+    # Collected freezone parameters are sent separately, so only recent turns are needed here
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 1000))
+    CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get("CHAT_HISTORY_MAX_MESSAGES", 50))  # rows loaded before trimming
+    CHAT_SUMMARY_KEEP_MESSAGES = int(os.environ.get("CHAT_SUMMARY_KEEP_MESSAGES", 10))  # newest messages kept out of the summary, if they fit the budget
+
+    # Admission control for /chatbot/ask: a token bucket per user and a global cap on
+    # concurrent model calls. State is a SQLite file shared by the workers on one host.
+    ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_STATE_PATH = os.environ.get("ADMISSION_STATE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "admission.sqlite3"))
+    ADMISSION_USER_RATE = float(os.environ.get("ADMISSION_USER_RATE", 0.5))          # requests per second refilled
+    ADMISSION_USER_BURST = int(os.environ.get("ADMISSION_USER_BURST", 5))            # bucket size
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", 16))   # model calls across all workers
+    ADMISSION_QUEUE_WAIT = float(os.environ.get("ADMISSION_QUEUE_WAIT", 2))          # seconds to wait for a slot
+    ADMISSION_MAX_WAITERS = int(os.environ.get("ADMISSION_MAX_WAITERS", 32))         # requests waiting for a slot at once
+    # Seconds before a lost slot is reclaimed; never shorter than a model call with every retry timing out
+    ADMISSION_SLOT_LEASE = float(os.environ.get("ADMISSION_SLOT_LEASE", OPENAI_TIMEOUT * (OPENAI_MAX_RETRIES + 1) + 30))
+
+    # Cache of /ask chain results for identical conversation states
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))  # entries per process, 0 disables
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 3600))    # seconds
+
+    # Semantic cache of answers to general first-turn questions
+    SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_DIR = os.environ.get("SEMANTIC_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "semantic"))
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.92))  # cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 5000))
+    SEMANTIC_CACHE_EMBEDDING_MODEL = os.environ.get("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+    # Freezone package catalog behind the suggestions: the packages ingested from admin
+    # uploads, or a CSV file when FREEZONE_CATALOG_PATH is set
+    FREEZONE_CATALOG_PATH = os.environ.get("FREEZONE_CATALOG_PATH", "")
+    RECOMMENDATION_RELOAD_INTERVAL = float(os.environ.get("RECOMMENDATION_RELOAD_INTERVAL", 30))  # seconds between catalog version checks
+    RECOMMENDATION_TOP_K = int(os.environ.get("RECOMMENDATION_TOP_K", 3))
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 1024))  # memoized parameter sets per catalog
+
+    # LLM token usage, aggregated per user, chat and call site into llm_usage
+    USAGE_FLUSH_INTERVAL = float(os.environ.get("USAGE_FLUSH_INTERVAL", 10))  # seconds between writes, 0 disables
+    LLM_PRICES = json.loads(os.environ.get("LLM_PRICES", "{}"))  # {"model": [prompt, cached prompt, completion]} USD per 1M tokens
+    ADMIN_EMAILS = [email.strip().lower() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()]
+
+    # Page sizes for the paginated chatbot endpoints
+    LATEST_CHATS_PAGE_SIZE = int(os.environ.get("LATEST_CHATS_PAGE_SIZE", 5))
+    LATEST_CHATS_MAX_PAGE_SIZE = int(os.environ.get("LATEST_CHATS_MAX_PAGE_SIZE", 50))
+    CHAT_HISTORY_MAX_PAGE_SIZE = int(os.environ.get("CHAT_HISTORY_MAX_PAGE_SIZE", 200))
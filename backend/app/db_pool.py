@@ -0,0 +1,67 @@
+# app/db_pool.py
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.metrics import DB_POOL_CHECKOUT_WAIT, DB_POOL_IN_USE, DB_POOL_OVERFLOW, DB_POOL_SIZE
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to get a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def build_engine_options(config):
+    """
+    SQLAlchemy engine options for the configured pool.
+
+    In PgBouncer mode (transaction pooling) PgBouncer does the pooling, so the app
+    opens a connection per checkout and the statement timeout is set per transaction
+    instead of as a startup parameter, which PgBouncer rejects.
+    """
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return {}
+
+    if config['DB_PGBOUNCER']:
+        return {'poolclass': NullPool, 'pool_pre_ping': config['DB_POOL_PRE_PING']}
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+def _observe_pool(pool):
+    DB_POOL_IN_USE.set(pool.checkedout())
+    DB_POOL_OVERFLOW.set(pool.overflow())
+
+
+def init_db_pool(app, db):
+    """Attach the pool metrics and the PgBouncer statement timeout to the app's engine."""
+    with app.app_context():
+        engine = db.engine
+
+    if isinstance(engine.pool, QueuePool):
+        DB_POOL_SIZE.set(engine.pool.size())
+        event.listen(engine, 'checkout', lambda dbapi_conn, record, proxy: _observe_pool(engine.pool))
+        event.listen(engine, 'checkin', lambda dbapi_conn, record: _observe_pool(engine.pool))
+
+    timeout_ms = app.config['DB_STATEMENT_TIMEOUT_MS']
+    if app.config['DB_PGBOUNCER'] and timeout_ms and engine.dialect.name == 'postgresql':
+        @event.listens_for(db.session, 'after_begin')
+        def set_statement_timeout(session, transaction, connection):
+            if connection.engine is engine:
+                connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
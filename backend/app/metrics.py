@@ -0,0 +1,76 @@
+# app/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from flask import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess,
+)
+
+# Database connection pool
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a database connection from the pool',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Database connections currently checked out of the pool',
+    multiprocess_mode='livesum',
+)
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections', 'Connections open beyond the pool size (negative while the pool is not full)',
+    multiprocess_mode='livesum',
+)
+DB_POOL_SIZE = Gauge('db_pool_size', 'Configured database pool size', multiprocess_mode='livesum')
+
+# /chatbot/ask pipeline
+ASK_STAGE_SECONDS = Histogram(
+    'chat_ask_stage_seconds',
+    'Time spent in each stage of a /chatbot/ask request',
+    ['stage'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+ASK_REQUESTS = Counter('chat_ask_requests_total', '/chatbot/ask requests by outcome', ['outcome'])
+ASK_FAST_PATH = Counter(
+    'chat_ask_fast_path_total', 'Slot answers filled by the rule-based extractor without a model call', ['slot'],
+)
+
+# /ask result caches: 'response' (exact inputs) and 'semantic' (general first questions).
+# The hit ratio is rate(chat_ask_cache_hits_total) / (rate(hits) + rate(misses)).
+ASK_CACHE_HITS = Counter('chat_ask_cache_hits_total', '/chatbot/ask results served from a cache', ['cache'])
+ASK_CACHE_MISSES = Counter('chat_ask_cache_misses_total', '/chatbot/ask cache lookups without a result', ['cache'])
+
+
+# LLM prompt tokens; the provider prompt cache hit ratio is
+# rate(llm_cached_prompt_tokens_total) / rate(llm_prompt_tokens_total)
+LLM_PROMPT_TOKENS = Counter('llm_prompt_tokens_total', 'Prompt tokens sent to the model', ['call_site'])
+LLM_CACHED_PROMPT_TOKENS = Counter(
+    'llm_cached_prompt_tokens_total', 'Prompt tokens served from the provider prompt cache', ['call_site'],
+)
+LLM_COALESCED_CALLS = Counter(
+    'llm_coalesced_calls_total', 'LLM calls that waited for an identical call already in flight instead of making their own',
+)
+
+# Time a block of the /ask pipeline, e.g. `with track_stage("persist"): ...`
+@contextmanager
+def track_stage(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ASK_STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+# Prometheus text endpoint; with PROMETHEUS_MULTIPROC_DIR set the values of all
+# worker processes are aggregated
+def metrics_view():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -17,8 +17,17 @@ class Chat(db.Model):
     name = db.Column(db.String(255), nullable=False)  # Name of the chat
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Foreign key to User table
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    summary = db.Column(db.Text, nullable=True)  # Rolling summary of the messages folded so far
+    summary_message_id = db.Column(db.Integer, nullable=True)  # Last message id included in the summary
+    parameters = db.Column(db.JSON, nullable=True)  # Freezone parameters collected so far
+    pending_slot = db.Column(db.String(32), nullable=True)  # Parameter the last reply asked for
     messages = db.relationship('Message', backref='chat', lazy=True)  # Relationship with messages
 
+    __table_args__ = (
+        db.Index('ix_chats_user_id_created_at', user_id, created_at.desc()),  # Latest chats of a user
+        db.Index('ix_chats_user_id_chat_id', user_id, chat_id),  # Chat lookup by user and chat id
+    )
+
 class Message(db.Model):
     __tablename__ = 'messages'
     id = db.Column(db.Integer, primary_key=True)
@@ -26,3 +35,63 @@ class Message(db.Model):
     sender = db.Column(db.String(50), nullable=False)  # 'user' or 'bot'
     content = db.Column(db.Text, nullable=False)  # Message content
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # Timestamp of the message
+
+    __table_args__ = (
+        db.Index('ix_messages_chat_id_timestamp', chat_id, timestamp),  # Messages of a chat in order
+    )
+
+class LlmUsage(db.Model):
+    __tablename__ = 'llm_usage'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, default=0)  # 0 for calls not made for a user
+    chat_id = db.Column(db.String(64), nullable=False, default='')  # Public chat id, '' outside of a chat
+    call_site = db.Column(db.String(64), nullable=False)  # Code path that made the call
+    model = db.Column(db.String(64), nullable=False, default='')
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    cached_prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completion_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    latency_ms = db.Column(db.BigInteger, nullable=False, default=0)  # Sum over all calls
+    cost_usd = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint(user_id, chat_id, call_site, model, name='uq_llm_usage_key'),  # One row per aggregate
+        db.Index('ix_llm_usage_chat_id', chat_id),  # Totals per chat
+    )
+
+class CatalogDocument(db.Model):
+    __tablename__ = 'catalog_documents'
+    id = db.Column(db.Integer, primary_key=True)
+    document_key = db.Column(db.String(255), nullable=False)  # Set by the admin, a new upload with the same key replaces the document
+    filename = db.Column(db.String(255), nullable=False)  # Name of the uploaded file
+    file_type = db.Column(db.String(16), nullable=False)  # 'pdf' or 'xlsx'
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of the file, re-uploads are skipped
+    package_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    packages = db.relationship('Package', backref='document', lazy=True, cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_catalog_documents_document_key', document_key),  # Earlier versions of a document
+    )
+
+class Package(db.Model):
+    __tablename__ = 'packages'
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('catalog_documents.id', ondelete='CASCADE'), nullable=False)
+    freezone = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    location = db.Column(db.String(255), nullable=True)  # Emirate or area
+    activities = db.Column(db.JSON, nullable=False, default=list)  # Business activities covered
+    price = db.Column(db.Float, nullable=True)  # AED
+    renewal_cost = db.Column(db.Float, nullable=True)  # AED per year
+    visas = db.Column(db.Integer, nullable=True)  # Visas included
+    shareholders = db.Column(db.Integer, nullable=True)  # Shareholders allowed
+    office_space = db.Column(db.Boolean, nullable=True)  # Physical office included
+    features = db.Column(db.JSON, nullable=False, default=list)  # Inclusions
+    limits = db.Column(db.JSON, nullable=False, default=list)  # Usage limits of the inclusions
+    add_ons = db.Column(db.JSON, nullable=False, default=list)  # Optional services: [{"name", "price"}]
+
+    __table_args__ = (
+        db.Index('ix_packages_document_id', document_id),  # Packages of a document
+    )
@@ -0,0 +1,51 @@
+"""
+Deterministic stand-in for ChatOpenAI used by the load test.
+
+It sleeps for a fixed latency and answers every prompt with the same reply template,
+so a run measures the backend's own overhead and never talks to OpenAI.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Shaped like the /ask chain output. {digest} is replaced with a hash of the prompt so
+# different conversation states get different (but reproducible) replies.
+DEFAULT_REPLY = json.dumps({
+    "response": "Thanks, noted ({digest}). How many visas will your company need?",
+    "parameters": {},
+    "all_parameters_collected": False,
+    "asked_parameter": "no_of_visas",
+})
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.0
+    reply: str = DEFAULT_REPLY
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        content = self.reply.replace("{digest}", digest)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+
+def fake_model_factory(latency=0.0, reply=DEFAULT_REPLY):
+    """Model factory for app.chatbot.chains.set_model_factory. Model kwargs are ignored."""
+    return lambda **model_kwargs: FakeChatModel(latency=latency, reply=reply)
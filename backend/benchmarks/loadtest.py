@@ -0,0 +1,224 @@
+"""
+End-to-end load test of the Flask backend with a fake LLM and a local database.
+
+Boots create_app() against a throwaway SQLite file (or --database-url), swaps every
+chain's model for a deterministic fake with a fixed latency, serves the app on a
+local port and drives each simulated user through register -> login -> a series of
+/chatbot/ask and /chatbot/chat-history calls, all users concurrently.
+
+Throughput and p50/p95/p99 latency per endpoint are printed and written to a JSON
+results file. Pass --compare with an earlier results file to print the difference.
+Runs offline: no OpenAI key or network access is needed.
+
+Usage (from the backend directory):
+    python benchmarks/loadtest.py --users 20 --asks-per-user 10 --llm-latency 0.2 --output loadtest.json
+    python benchmarks/loadtest.py --compare loadtest.json --output loadtest-new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--asks-per-user", type=int, default=10, help="/chatbot/ask calls per user")
+    parser.add_argument("--chats-per-user", type=int, default=2, help="chats the asks are spread over")
+    parser.add_argument("--history-every", type=int, default=1, help="fetch the chat history after every N asks")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds the fake model takes per call")
+    parser.add_argument("--llm-reply", default=None, help="reply template of the fake model ({digest} = prompt hash)")
+    parser.add_argument("--database-url", default=None, help="database to use instead of a fresh SQLite file")
+    parser.add_argument("--admission", action="store_true", help="keep the /ask rate limits enabled")
+    parser.add_argument("--output", default="loadtest-results.json", help="results file to write")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    return parser.parse_args()
+
+
+def configure_environment(args, workdir):
+    # Config reads the environment when it is imported, so this runs before importing the app
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}?timeout=30"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    os.environ["ADMISSION_ENABLED"] = "true" if args.admission else "false"
+    os.environ["ADMISSION_STATE_PATH"] = os.path.join(workdir, "admission.sqlite3")
+    os.environ.setdefault("PASSWORD_HASH_QUEUE_LIMIT", str(max(8, args.users)))
+    os.environ.setdefault("PASSWORD_HASH_QUEUE_WAIT", "30")
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+    return database_url
+
+
+def start_app(args):
+    from werkzeug.serving import make_server
+    from app import create_app, db
+    from app.chatbot.chains import set_model_factory
+    from fake_llm import DEFAULT_REPLY, fake_model_factory
+
+    # Installed before create_app so no chain is ever built on ChatOpenAI
+    set_model_factory(fake_model_factory(args.llm_latency, args.llm_reply or DEFAULT_REPLY))
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+
+    def timed(self, endpoint, send):
+        started = time.perf_counter()
+        try:
+            response = send()
+            status = response.status_code
+        except Exception as e:
+            response, status = None, type(e).__name__
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[endpoint].append(elapsed)
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint][str(status)] += 1
+        return response
+
+
+def run_user(base_url, index, args, recorder):
+    import httpx
+
+    email = f"loadtest-{index}@example.com"
+    password = f"loadtest-password-{index}"
+    with httpx.Client(base_url=base_url, timeout=120) as client:
+        recorder.timed("POST /auth/register", lambda: client.post(
+            "/auth/register", json={"email": email, "password": password, "username": f"loadtest{index}"},
+        ))
+        response = recorder.timed("POST /auth/login", lambda: client.post(
+            "/auth/login", json={"email": email, "password": password},
+        ))
+        if response is None or "access_token" not in response.cookies:
+            return
+
+        # The cookie is marked Secure, so it is set by hand for the plain-HTTP test server
+        client.cookies.set("access_token", response.cookies["access_token"])
+
+        for ask in range(args.asks_per_user):
+            chat_id = f"loadtest-{index}-{ask % args.chats_per_user}"
+            recorder.timed("POST /chatbot/ask", lambda: client.post(
+                "/chatbot/ask", json={"chat_id": chat_id, "message": f"Question {ask} from user {index}"},
+            ))
+            if (ask + 1) % args.history_every == 0:
+                recorder.timed("GET /chatbot/chat-history", lambda: client.get(
+                    "/chatbot/chat-history", params={"chat_id": chat_id},
+                ))
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(q / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder, wall_time):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        values = sorted(samples)
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": dict(recorder.errors[endpoint]),
+            "throughput_rps": round(len(values) / wall_time, 2),
+            "mean_ms": round(1000 * sum(values) / len(values), 2),
+            "p50_ms": round(1000 * percentile(values, 50), 2),
+            "p95_ms": round(1000 * percentile(values, 95), 2),
+            "p99_ms": round(1000 * percentile(values, 99), 2),
+            "max_ms": round(1000 * values[-1], 2),
+        }
+    return endpoints
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results, baseline=None):
+    print(f"\n{'endpoint':<28}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in results["endpoints"].items():
+        print(
+            f"{endpoint:<28}{stats['requests']:>9}{sum(stats['errors'].values()):>8}{stats['throughput_rps']:>9}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+        )
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if previous:
+            deltas = [
+                f"{key[:-3]} {100 * (stats[key] - previous[key]) / previous[key]:+.1f}%"
+                for key in ("p50_ms", "p95_ms", "p99_ms") if previous[key]
+            ]
+            print(f"{'':<28}vs baseline: " + ", ".join(deltas))
+
+
+def main():
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix="chat-loadtest-") as workdir:
+        database_url = configure_environment(args, workdir)
+        server, base_url = start_app(args)
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=args.users) as pool:
+                for future in [pool.submit(run_user, base_url, i, args, recorder) for i in range(args.users)]:
+                    future.result()
+        finally:
+            wall_time = time.perf_counter() - started
+            server.shutdown()
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": {
+            "users": args.users,
+            "asks_per_user": args.asks_per_user,
+            "chats_per_user": args.chats_per_user,
+            "history_every": args.history_every,
+            "llm_latency": args.llm_latency,
+            "admission": args.admission,
+            "database": database_url.split(":", 1)[0],
+        },
+        "wall_time_s": round(wall_time, 3),
+        "endpoints": summarize(recorder, wall_time),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_report(results, baseline)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
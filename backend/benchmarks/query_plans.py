@@ -0,0 +1,132 @@
+"""
+Query plans of the chat/message hot queries before and after the indexes added in
+migration c52d8b1e7a39, on a synthetic dataset of millions of rows.
+
+The data is generated in a throwaway schema (`bench_query_plans`) of the configured
+Postgres database and dropped afterwards, the real tables are never touched.
+
+Usage (from the backend directory):
+    python benchmarks/query_plans.py --users 20000 --chats-per-user 10 --messages-per-chat 20
+"""
+import argparse
+import os
+import sys
+import time
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.config import Config
+
+SCHEMA = "bench_query_plans"
+
+SETUP = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"""CREATE TABLE {SCHEMA}.chats (
+        id serial PRIMARY KEY,
+        chat_id varchar(64) UNIQUE NOT NULL,
+        name varchar(255) NOT NULL,
+        user_id integer NOT NULL,
+        created_at timestamp
+    )""",
+    f"""CREATE TABLE {SCHEMA}.messages (
+        id serial PRIMARY KEY,
+        chat_id integer NOT NULL REFERENCES {SCHEMA}.chats (id),
+        sender varchar(50) NOT NULL,
+        content text NOT NULL,
+        timestamp timestamp
+    )""",
+]
+
+# Chats are spread over users and time so that one user's chats are scattered
+# across the table, like they are in production.
+SEED = [
+    f"""INSERT INTO {SCHEMA}.chats (chat_id, name, user_id, created_at)
+        SELECT md5(g::text), 'Chat ' || g, 1 + (g % :users), now() - (g || ' seconds')::interval
+        FROM generate_series(1, :users * :chats_per_user) AS g""",
+    f"""INSERT INTO {SCHEMA}.messages (chat_id, sender, content, timestamp)
+        SELECT 1 + (g % (:users * :chats_per_user)),
+               CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+               repeat('lorem ipsum ', 10),
+               now() - ((:users * :chats_per_user * :messages_per_chat - g) || ' seconds')::interval
+        FROM generate_series(1, :users * :chats_per_user * :messages_per_chat) AS g""",
+    f"ANALYZE {SCHEMA}.chats",
+    f"ANALYZE {SCHEMA}.messages",
+]
+
+INDEXES = [
+    f"CREATE INDEX ix_messages_chat_id_timestamp ON {SCHEMA}.messages (chat_id, timestamp)",
+    f"CREATE INDEX ix_chats_user_id_created_at ON {SCHEMA}.chats (user_id, created_at DESC)",
+    f"CREATE INDEX ix_chats_user_id_chat_id ON {SCHEMA}.chats (user_id, chat_id)",
+    f"ANALYZE {SCHEMA}.chats",
+    f"ANALYZE {SCHEMA}.messages",
+]
+
+# The queries issued by the chatbot routes
+QUERIES = {
+    "chat history": f"SELECT * FROM {SCHEMA}.messages WHERE chat_id = :chat_pk ORDER BY timestamp",
+    "chat lookup": f"SELECT * FROM {SCHEMA}.chats WHERE chat_id = :chat_id AND user_id = :user_id LIMIT 1",
+    "latest chats": f"SELECT * FROM {SCHEMA}.chats WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 5",
+}
+
+
+def explain(connection, sql, params):
+    plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params).scalars().all()
+    execution = next((line for line in plan if line.startswith("Execution Time")), "")
+    return plan, execution
+
+
+def report(connection, title, params):
+    print(f"\n===== {title} =====")
+    for name, sql in QUERIES.items():
+        explain(connection, sql, params)  # warm the cache
+        plan, execution = explain(connection, sql, params)
+        print(f"\n--- {name}: {execution}")
+        print("\n".join(plan))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=Config.SQLALCHEMY_DATABASE_URI)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--chats-per-user", type=int, default=10)
+    parser.add_argument("--messages-per-chat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark schema afterwards")
+    args = parser.parse_args()
+
+    engine = create_engine(args.dsn)
+    sizes = {"users": args.users, "chats_per_user": args.chats_per_user, "messages_per_chat": args.messages_per_chat}
+
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in SETUP:
+            connection.execute(text(statement))
+
+        started = time.perf_counter()
+        for statement in SEED:
+            connection.execute(text(statement), sizes)
+        print(f"Seeded {args.users * args.chats_per_user} chats and "
+              f"{args.users * args.chats_per_user * args.messages_per_chat} messages "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        # Pick a chat in the middle of the table and its owner
+        chat = connection.execute(text(
+            f"SELECT id, chat_id, user_id FROM {SCHEMA}.chats WHERE id = (SELECT max(id) / 2 FROM {SCHEMA}.chats)"
+        )).one()
+        params = {"chat_pk": chat.id, "chat_id": chat.chat_id, "user_id": chat.user_id}
+
+        report(connection, "before indexes", params)
+
+        started = time.perf_counter()
+        for statement in INDEXES:
+            connection.execute(text(statement))
+        print(f"\nBuilt indexes in {time.perf_counter() - started:.1f}s")
+
+        report(connection, "after indexes", params)
+
+        if not args.keep:
+            connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark of the freezone recommender.
+
+Writes a synthetic catalog of --packages rows to a temporary CSV (random names and
+numbers, for timing only), then times the first (cold) ranking of a set of parameter
+combinations and the memoized repeats, and prints the top packages of one query.
+
+Usage (from the backend directory):
+    python benchmarks/recommend.py --packages 5000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from app.chatbot.recommend import load_catalog_csv
+
+LOCATIONS = ["Dubai", "Abu Dhabi", "Sharjah", "Ajman", "Ras Al Khaimah", "Fujairah", "Umm Al Quwain"]
+ACTIVITIES = ["trading", "consulting", "e-commerce", "media", "logistics", "manufacturing", "software", "education"]
+
+
+def synthetic_catalog(packages, seed):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "freezone": [f"Freezone {i % 97}" for i in range(packages)],
+        "package": [f"Package {i}" for i in range(packages)],
+        "location": [rng.choice(LOCATIONS) for _ in range(packages)],
+        "activities": [";".join(rng.sample(ACTIVITIES, rng.randint(1, 3))) for _ in range(packages)],
+        "price": [rng.randrange(5_000, 80_000, 500) for _ in range(packages)],
+        "renewal_cost": [rng.randrange(5_000, 60_000, 500) for _ in range(packages)],
+        "visas": [rng.randint(0, 10) for _ in range(packages)],
+        "shareholders": [rng.randint(1, 50) for _ in range(packages)],
+        "office_space": [rng.random() < 0.4 for _ in range(packages)],
+    })
+
+
+def random_parameters(rng):
+    return {
+        "no_of_shareholders": rng.randint(1, 5),
+        "no_of_visas": rng.randint(0, 6),
+        "activities": rng.choice(ACTIVITIES),
+        "cost": float(rng.randrange(10_000, 60_000, 5_000)),
+        "office_space": rng.random() < 0.5,
+        "preferred_location": rng.choice(LOCATIONS),
+    }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return 1000 * (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", type=int, default=5000, help="rows in the synthetic catalog")
+    parser.add_argument("--queries", type=int, default=200, help="distinct parameter combinations")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix="chat-recommend-") as workdir:
+        path = os.path.join(workdir, "catalog.csv")
+        synthetic_catalog(args.packages, args.seed).to_csv(path, index=False)
+        started = time.perf_counter()
+        catalog = load_catalog_csv(path, cache_size=args.queries)
+        load_ms = 1000 * (time.perf_counter() - started)
+
+    queries = [random_parameters(rng) for _ in range(args.queries)]
+    cold = [timed(lambda: catalog.recommend(parameters, args.top_k)) for parameters in queries]
+    warm = [timed(lambda: catalog.recommend(parameters, args.top_k)) for parameters in queries]
+
+    print(f"catalog: {catalog.size} packages, loaded in {load_ms:.1f} ms")
+    for name, samples in (("cold", cold), ("memoized", warm)):
+        samples.sort()
+        print(f"{name:<9} median {statistics.median(samples):.3f} ms, max {samples[-1]:.3f} ms")
+
+    print(f"\ntop {args.top_k} for {queries[0]}:")
+    for package in catalog.recommend(queries[0], args.top_k):
+        print(f"  {package['freezone']} - {package['package']} (AED {package['price']:,.0f}, score {package['score']}): "
+              f"{', '.join(package['reasons'])}")
+
+
+if __name__ == "__main__":
+    main()
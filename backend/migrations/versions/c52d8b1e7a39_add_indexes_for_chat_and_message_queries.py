@@ -0,0 +1,41 @@
+"""Add indexes for chat and message queries
+
+Revision ID: c52d8b1e7a39
+Revises: a84e2c6f51d0
+Create Date: 2026-10-18 11:47:20.530412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d8b1e7a39'
+down_revision = 'a84e2c6f51d0'
+branch_labels = None
+depends_on = None
+
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction, so the indexes are
+# built in an autocommit block and do not lock the tables against writes.
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_messages_chat_id_timestamp', 'messages', ['chat_id', 'timestamp'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_chats_user_id_created_at', 'chats', ['user_id', sa.text('created_at DESC')],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_chats_user_id_chat_id', 'chats', ['user_id', 'chat_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_chats_user_id_chat_id', table_name='chats', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_chats_user_id_created_at', table_name='chats', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_messages_chat_id_timestamp', table_name='messages', postgresql_concurrently=True, if_exists=True)
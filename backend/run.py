@@ -1,6 +1,10 @@
 from app import create_app, db
 
-app = create_app()
+# The password hashing pool spawns its workers, and they re-import this module as
+# __mp_main__ when the app is started with `python run.py`. They only hash, so they
+# skip building a second app.
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
@@ -11,6 +11,8 @@ from langchain.output_parsers import PydanticOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from typing import List, Dict, Optional
 import json
 from dotenv import load_dotenv
@@ -19,6 +21,14 @@ from langchain.memory import ConversationBufferMemory
 import os
 from flask_caching import Cache
 from langchain_community.tools import DuckDuckGoSearchRun
+from app.chatbot.chains import register_chain, get_chain, init_chains
+from app.chatbot.history import history_messages
+from app.chatbot.semantic_cache import create_semantic_cache
+from app.chatbot.cache import make_cache_key
+from app.chatbot.singleflight import in_flight
+from app.chatbot.usage import init_usage_tracking, usage_config
+from app.config import Config
+from app import db
 
 load_dotenv()
 
@@ -45,6 +55,11 @@ class InternetSearchRequired(BaseModel):
 app = Flask(__name__)
 CORS(app)
 
+# LLM usage is written to the chat database
+app.config.from_object(Config)
+db.init_app(app)
+init_usage_tracking(app)
+
 # Configure cache
 app.config['CACHE_TYPE'] = 'SimpleCache'  # Change to 'redis' if using Redis
 app.config['CACHE_DEFAULT_TIMEOUT'] = 1800  # Timeout in seconds (1800 seconds = 30 minutes)
@@ -59,47 +74,154 @@ cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})  # Use SimpleCache for
 
 
 
-def call_openai_api(chat_history, current_json, user_input):
-
-    model = ChatOpenAI(api_key=openai_api_key, temperature=1, model="gpt-4o")
-    # model = ChatOpenAI(api_key=openai_api_key, temperature=0)
-
-    # Define the parser
-    parser = JsonOutputParser(pydantic_object=ResponseStructure)
-
-    query = f"""
-
-            You are a Freezone assistant chatbot. Your name is FZcompare.AI, and you are designed to help users plan their Freezone and provide Freezones-related information.
-
-            You have to interact with the user as a customer service agent and get them to answer questions. Ensure your responses are polite, engaging, and context-aware, using natural language to guide the user through the necessary details. Here are some key points to remember:
-
-         
-            1. Engage politely, analyze chat history, and provide informative responses.
-            2. Analyze chat history carefully before responding, providing inferences only when appropriate.
-            3. Each response should be informative and contain at least 20 words.
-            4. If the user seems confused or requests suggestions then respond accordingly and guide them. base your suggestion on the questions already answered.
-            7. Only give inferences when you have the answer; do not guess. If needed ask user for clarification in your next reply. also if you cannot match the answer to the value options then ask the user to clarify
-            17. if the user is normally greeting like saying hi hello then greet them normally and introduce yourself (intro is important) say You are a travel assistant chatbot named Travel.AI, designed to help users plan their Freezone and provide Freezone-related information and how you need some info to do that.
-            19. finally the most important thing is that your order and time of asking each question should not be ambigious. it should make sense, if the user is asking about a place or any other thing then resolve that first and ask the user if he have any more query. and only after the user's query has been answered then from there keeping the context in mind ask the next question in a relevant wany. dont just answer and ask the next question that is irrelevant. interact just like an professional customer support helping and guiding the user along
-
-            always ask the questions in a logically sensible way
-
-            Please ensure responses are informative, accurate, and tailored to the user's queries and preferences. Use natural language to engage users and provide a seamless experience throughout their Freezone planning journey.
-
-            Below are a few examples for you to learn how to do it:
-
-            Chat history:
-            {chat_history}
+# Parsers, prompts and chains are built once here instead of on every call
+response_parser = JsonOutputParser(pydantic_object=ResponseStructure)
+internet_search_parser = JsonOutputParser(pydantic_object=InternetSearchRequired)
+
+# Static instructions shared by the answer chains. They open every prompt as a
+# byte-stable system message so the provider can cache them; the chat history follows
+# as chat messages (it only grows at the end between turns), then the per-call data
+# and the user's query.
+FREEZONE_ASSISTANT_PROMPT = """
+You are a Freezone assistant chatbot. Your name is FZcompare.AI, and you are designed to help users plan their Freezone and provide Freezones-related information.
+
+You have to interact with the user as a customer service agent and get them to answer questions. Ensure your responses are polite, engaging, and context-aware, using natural language to guide the user through the necessary details. Here are some key points to remember:
+
+
+1. Engage politely, analyze chat history, and provide informative responses.
+2. Analyze chat history carefully before responding, providing inferences only when appropriate.
+3. Each response should be informative and contain at least 20 words.
+4. If the user seems confused or requests suggestions then respond accordingly and guide them. base your suggestion on the questions already answered.
+7. Only give inferences when you have the answer; do not guess. If needed ask user for clarification in your next reply. also if you cannot match the answer to the value options then ask the user to clarify
+17. if the user is normally greeting like saying hi hello then greet them normally and introduce yourself (intro is important) say You are a travel assistant chatbot named Travel.AI, designed to help users plan their Freezone and provide Freezone-related information and how you need some info to do that.
+19. finally the most important thing is that your order and time of asking each question should not be ambigious. it should make sense, if the user is asking about a place or any other thing then resolve that first and ask the user if he have any more query. and only after the user's query has been answered then from there keeping the context in mind ask the next question in a relevant wany. dont just answer and ask the next question that is irrelevant. interact just like an professional customer support helping and guiding the user along
+
+always ask the questions in a logically sensible way
+
+Please ensure responses are informative, accurate, and tailored to the user's queries and preferences. Use natural language to engage users and provide a seamless experience throughout their Freezone planning journey.
+
+you have to answer every user query unless it is entirely on a different domain than the or Freezone use case. for example you have to answer if user asks you to find the visa, etc or if he asks about what is the current time or any visa related news. under any circumstances you have to answer that
+"""
+
+information_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=FREEZONE_ASSISTANT_PROMPT),
+    SystemMessage(content="""
+    You are a travel assistant. Your task is to answer the general travel query using the provided information.
+
+    Steps to follow:
+    1. Carefully read and understand the user's query.
+    2. Use only the provided context to find the most relevant and accurate information.
+    3. Ensure your response is concise, informative, and engaging, tailored to the user's query.
+    4. Maintain relevance and enhance the user's understanding or provide actionable advice.
+    5. Use a professional and helpful tone.
+    """),
+    MessagesPlaceholder("chat_history"),
+    ("system", "Information:\n{information}"),
+    ("human", "{query}"),
+])
+
+search_results_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=FREEZONE_ASSISTANT_PROMPT),
+    SystemMessage(content="""Answer the user query. You are given internet search results for it, kindly use them as a knowledge context only , Remember this is not the user's reply so do not include any inference from the search results at any cost (most important) \n\n Remember you have to give a detailed answer to the user's query using the search results. if you cannot answer or if the data is for internet search is not sufficient just say "i data from internet is not sufficient to answer that query" answer the query no matter what  """),
+    MessagesPlaceholder("chat_history"),
+    ("system", "Internet search results for the query {online_search_query}:\n{search_results}"),
+    ("human", "{query}"),
+])
+
+answer_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=FREEZONE_ASSISTANT_PROMPT),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{query}"),
+])
+
+internet_search_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content="see if the user query can me answered by using gpt, if not then we can perform an internet search and provide gpt with that internet search result realtime data , for example this can be used to answer any query if the llm needs internet data to answer it better. \n" + internet_search_parser.get_format_instructions() + "\n\n    if the search is required then give detailed online_search_query that will fetch desired response\n"),
+    ("human", "query: {query}."),
+])
+
+register_chain("information_answer", lambda model: information_prompt | model | response_parser, temperature=0.6, model_name="gpt-4o")
+register_chain("search_results_answer", lambda model: search_results_prompt | model | response_parser, api_key=openai_api_key, temperature=1, model="gpt-4o")
+register_chain("answer", lambda model: answer_prompt | model | response_parser, api_key=openai_api_key, temperature=1, model="gpt-4o")
+register_chain("internet_search_check", lambda model: internet_search_prompt | model | internet_search_parser, api_key=openai_api_key, temperature=0, model_name="gpt-4o-mini")
+init_chains(app)
+
+# Bump this whenever the call_openai_api prompts change, it invalidates the semantic cache
+CALL_OPENAI_PROMPT_VERSION = "3"
+
+# Answers to general first questions, reused for similarly phrased questions
+faq_cache = None
+if app.config['SEMANTIC_CACHE_ENABLED']:
+    faq_cache = create_semantic_cache(
+        os.path.join(app.config['SEMANTIC_CACHE_DIR'], "call_openai_api.npz"),
+        CALL_OPENAI_PROMPT_VERSION,
+        model=app.config['SEMANTIC_CACHE_EMBEDDING_MODEL'],
+        threshold=app.config['SEMANTIC_CACHE_THRESHOLD'],
+        max_entries=app.config['SEMANTIC_CACHE_MAX_ENTRIES'],
+    )
 
-            you have to answer every user query unless it is entirely on a different domain than the or Freezone use case. for example you have to answer if user asks you to find the visa, etc or if he asks about what is the current time or any visa related news. under any circumstances you have to answer that
-            """
-    
-    internet = gpt_call_with_internet_search(user_input, current_json)
+_vector_store = None
+
+
+def get_vector_store():
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = PineconeVectorStore(index_name=pinecone_index_name, embedding=embeddings, text_key="text")
+    return _vector_store
+
+
+# Identical concurrent calls (same history, state and input) share one upstream call
+def call_openai_api(chat_history, current_json, user_input, user_id=0, chat_id=""):
+    key = make_cache_key(CALL_OPENAI_PROMPT_VERSION, "call_openai_api", {
+        "chat_history": chat_history,
+        "current_json": json.dumps(current_json, sort_keys=True, default=str),
+        "user_input": user_input,
+    })
+    return in_flight.do(key, _call_openai_api, chat_history, current_json, user_input, user_id, chat_id)
+
+
+# A general question opens the chat: nothing is collected and the history is empty
+# or holds only this user message
+def is_general_question(chat_history, current_json, user_input):
+    if current_json:
+        return False
+    if not chat_history:
+        return True
+    if isinstance(chat_history, str):
+        return chat_history.strip() == user_input.strip()
+    return len(chat_history) == 1 and chat_history[0].get("role") == "user" and chat_history[0].get("content") == user_input
+
+
+# The history as chat messages, without the user's latest message, which is sent last
+# as the query. A history given as one string is taken as a single user turn.
+def history_before_query(chat_history, user_input):
+    if isinstance(chat_history, str):
+        chat_history = [{"role": "user", "content": chat_history}] if chat_history.strip() else []
+    turns = list(chat_history or [])
+    if turns and turns[-1].get("role") == "user" and turns[-1].get("content") == user_input:
+        turns = turns[:-1]
+    return history_messages(turns)
+
+
+def _call_openai_api(chat_history, current_json, user_input, user_id=0, chat_id=""):
+    config = usage_config("call_openai_api", user_id, chat_id)
+
+    general_question = faq_cache is not None and is_general_question(chat_history, current_json, user_input)
+    if general_question:
+        try:
+            cached = faq_cache.lookup(user_input)
+        except Exception as e:
+            print("Semantic cache lookup failed:", e)
+            cached = None
+        if cached is not None:
+            return cached
+
+    internet = gpt_call_with_internet_search(user_input, user_id=user_id, chat_id=chat_id)
+    chain_inputs = {"chat_history": history_before_query(chat_history, user_input), "query": user_input}
 
     if internet['internet_search_required']:
         print("yes")
-        vector_store = PineconeVectorStore(index_name=pinecone_index_name, embedding=embeddings, text_key="text")
-        information = vector_store.similarity_search_with_relevance_scores(query=query, k=5)
+        vector_store = get_vector_store()
+        information = vector_store.similarity_search_with_relevance_scores(query=user_input, k=5)
         totalScore = 0
         for doc in information:
             score = doc[1] * 100
@@ -107,79 +229,35 @@ def call_openai_api(chat_history, current_json, user_input):
         avgScore = totalScore / len(information)
         print("Average Scoree ",avgScore)
         if avgScore > 80:
-            prompt_template = PromptTemplate(
-                template="""
-                You are a travel assistant. Your task is to answer the general travel query using the provided information.
-
-                Query:
-                {query}
-
-                Information:
-                {information}
-
-                Steps to follow:
-                1. Carefully read and understand the user's query.
-                2. Use only the provided context to find the most relevant and accurate information.
-                3. Ensure your response is concise, informative, and engaging, tailored to the user's query.
-                4. Maintain relevance and enhance the user's understanding or provide actionable advice.
-                5. Use a professional and helpful tone.
-                """,
-                input_variables=["query", "information"], partial_variables={"format_instructions": parser.get_format_instructions()},
-            )
-            model = ChatOpenAI(temperature=0.6, model_name="gpt-4o")
-            chain = prompt_template | model | parser
+            chain = get_chain("information_answer")
             print(information)
-            response = chain.invoke({"query": query, "information": information})        
+            response = chain.invoke({**chain_inputs, "information": information}, config=config)
         else:
             print("internet query")
-        # Define the prompt template
             online_search_query = internet['online_search_query']
             search_results = search.run(online_search_query)
-            prompt = PromptTemplate(
-                template="""Answer the user query.\n{query}\n\n\n\n    below is the internet search results for the query {online_search_query} so kindly use it as a knowledge context only , Remember this is not the user's reply so do not include any inference from the below text at any cost (most important \n\n\n\n  {search_results}) \n\n Remember you have to give a detailed answer to the user's query using the above data. if you cannot answer or if the data is for internet search is not sufficient just say "i data from internet is not sufficient to answer that query" answer the query no matter what  """,
-                input_variables=["query"],
-                partial_variables={"format_instructions": parser.get_format_instructions()},
-            )
-            chain = prompt | model | parser
-            response = chain.invoke({"query":query, "search_results":search_results, "online_search_query":online_search_query })
+            chain = get_chain("search_results_answer")
+            response = chain.invoke({**chain_inputs, "search_results": search_results, "online_search_query": online_search_query}, config=config)
 
     else:
-        prompt = PromptTemplate(
-            template="""Answer the user query.\n{query}\n""",
-            input_variables=["query"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
-
-
-        # Create the LLMChain
-        chain = prompt | model | parser
-
+        chain = get_chain("answer")
 
         # Invoke the chain
-        response = chain.invoke({"query":query})
+        response = chain.invoke(chain_inputs, config=config)
         
     
     updated_json = response
     print(updated_json)
+    if general_question and not internet['internet_search_required']:
+        try:
+            faq_cache.add(user_input, response)
+        except Exception as e:
+            print("Semantic cache update failed:", e)
     return response
 
 # Function to handle GPT calls with internet search capability
-def gpt_call_with_internet_search(chat_history: str) -> Dict:
-    # Set up the parser
-    parser = JsonOutputParser(pydantic_object=InternetSearchRequired)
-
-    # Set up the prompt template
-    prompt = PromptTemplate(
-        template="see if the user query can me answered by using gpt, if not then we can perform an internet search and provide gpt with that internet search result realtime data , for example this can be used to answer any query if the llm needs internet data to answer it better. \n{format_instructions}\nquery: {query}.\n\n\n\n    if the search is required then give detailed online_search_query that will fetch desired response\n",
-        input_variables=["query"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
-
-    # Set up the model
-    model = ChatOpenAI(api_key=openai_api_key, temperature=0, model_name="gpt-4o-mini")
-
-    # Create the chain
-    chain = prompt | model | parser
+def gpt_call_with_internet_search(chat_history: str, user_id: int = 0, chat_id: str = "") -> Dict:
+    chain = get_chain("internet_search_check")
 
     # Create the query including chat history
     query_with_history = f"""
@@ -206,7 +284,7 @@ def gpt_call_with_internet_search(chat_history: str) -> Dict:
     # query_with_history = 
 
     # Perform the GPT call
-    response = chain.invoke({"query": chat_history})
+    response = chain.invoke({"query": chat_history}, config=usage_config("internet_search_check", user_id, chat_id))
 
     return response
 